@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+"""
+Module to benchmark the redaction & hashing paths
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import timeit
+from typing import Callable, Iterator, List, Tuple
+
+from encrypt_password import hash_password, is_valid
+from filtered_logger import (
+    PII_FIELDS, ColumnRedactor, RedactingFormatter, filter_datum
+)
+
+MESSAGE_SIZES = (1, 10, 100)
+FIELD_COUNTS = (5, 20)
+SEPARATORS = (';', ',', '|')
+BCRYPT_COSTS = (4, 8, 10, 12)
+ROWS = 1000000
+THRESHOLD = 0.10
+
+
+def measure(func: Callable, repeat: int, number: int) -> dict:
+    """
+    Time a callable
+    Args:
+        Callable: func
+        int: repeat, timing runs
+        int: number, calls per run
+    Returns:
+        dict: seconds per call
+    """
+    runs = [t / number for t in timeit.Timer(func).repeat(repeat, number)]
+    return {'min': min(runs), 'median': statistics.median(runs),
+            'repeat': repeat, 'number': number}
+
+
+def make_message(
+    fields: List[str], pairs: int, separator: str
+) -> str:
+    """
+    Build a key=value message
+    Args:
+        List[str]: fields
+        int: pairs, number of key=value pairs
+        str: separator
+    Returns:
+        str: message
+    """
+    keys = fields + ['ip', 'last_login', 'user_agent']
+    return ''.join('{}=value{}{}'.format(keys[i % len(keys)], i, separator)
+                   for i in range(pairs))
+
+
+def redaction_cases(
+    repeat: int, number: int
+) -> Iterator[Tuple[str, dict]]:
+    """
+    filter_datum & RedactingFormatter.format cases
+    """
+    for count in FIELD_COUNTS:
+        fields = list(PII_FIELDS) + ['field{}'.format(i)
+                                     for i in range(count - len(PII_FIELDS))]
+        for separator in SEPARATORS:
+            for size in MESSAGE_SIZES:
+                message = make_message(fields, size * count, separator)
+                name = 'filter_datum[fields={},sep={},pairs={}]'.format(
+                    count, separator, size * count)
+                yield name, measure(
+                    lambda: filter_datum(fields, '***', message, separator),
+                    repeat, number)
+    formatter = RedactingFormatter(PII_FIELDS)
+    for size in MESSAGE_SIZES:
+        message = make_message(list(PII_FIELDS), size * 8, ';')
+
+        def format_record():
+            record = logging.LogRecord('user_data', logging.INFO, None,
+                                       None, message, None, None)
+            formatter.format(record)
+        yield 'RedactingFormatter.format[pairs={}]'.format(size * 8), \
+            measure(format_record, repeat, number)
+
+
+def row_cases(rows: int, repeat: int) -> Iterator[Tuple[str, dict]]:
+    """
+    Whole table export, regex against column-aware redaction
+    """
+    columns = list(PII_FIELDS) + ['ip', 'last_login', 'user_agent']
+    table = [tuple('{}{}'.format(c, i) for c in columns)
+             for i in range(rows)]
+    redactor = ColumnRedactor(columns, PII_FIELDS,
+                              RedactingFormatter.REDACTION)
+
+    def regex_rows():
+        for row in table:
+            msg = '{};'.format('; '.join(
+                '{}={}'.format(c, v) for c, v in zip(columns, row)))
+            filter_datum(PII_FIELDS, '***', msg, ';')
+
+    def column_rows():
+        for _ in redactor.format_rows(table):
+            pass
+    yield 'rows.regex[rows={}]'.format(rows), measure(regex_rows, repeat, 1)
+    yield 'rows.column[rows={}]'.format(rows), \
+        measure(column_rows, repeat, 1)
+
+
+def hashing_cases(
+    costs: Tuple[int, ...], repeat: int
+) -> Iterator[Tuple[str, dict]]:
+    """
+    hash_password & is_valid across bcrypt cost factors
+    """
+    password = 'MyAmazingPassw0rd'
+    yield 'hash_password[default]', \
+        measure(lambda: hash_password(password), repeat, 1)
+    for cost in costs:
+        hashed = hash_password(password, cost)
+        yield 'hash_password[cost={}]'.format(cost), \
+            measure(lambda: hash_password(password, cost), repeat, 1)
+        yield 'is_valid[cost={}]'.format(cost), \
+            measure(lambda: is_valid(hashed, password), repeat, 1)
+
+
+def run(args: argparse.Namespace) -> dict:
+    """
+    Run every selected case
+    Returns:
+        dict: run metadata & results keyed by case name
+    """
+    results = {}
+    cases = []
+    if 'redaction' in args.suites:
+        cases.append(redaction_cases(args.repeat, args.number))
+    if 'rows' in args.suites:
+        cases.append(row_cases(args.rows, args.repeat))
+    if 'hashing' in args.suites:
+        cases.append(hashing_cases(args.costs, args.repeat))
+    for suite in cases:
+        for name, result in suite:
+            results[name] = result
+            print('{:<50} {:>12.3f} us'.format(name, result['min'] * 1e6),
+                  file=sys.stderr)
+    return {'timestamp': time.time(), 'python': platform.python_version(),
+            'machine': platform.machine(), 'results': results}
+
+
+def compare(
+    base: dict, new: dict, threshold: float
+) -> List[Tuple[str, float]]:
+    """
+    Find cases slower than the baseline by more than threshold
+    Args:
+        dict: base run
+        dict: new run
+        float: threshold, 0.10 is 10% slower
+    Returns:
+        List[Tuple[str, float]]: regressed cases & relative change
+    """
+    regressions = []
+    for name, result in sorted(new['results'].items()):
+        old = base['results'].get(name)
+        if old is None or old['min'] == 0:
+            continue
+        change = result['min'] / old['min'] - 1
+        flag = 'REGRESSION' if change > threshold else ''
+        print('{:<50} {:>+8.1%} {}'.format(name, change, flag))
+        if change > threshold:
+            regressions.append((name, change))
+    return regressions
+
+
+def main() -> None:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('-o', '--output', help='write results as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two JSON results instead of running')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    parser.add_argument('--suites', nargs='+',
+                        default=['redaction', 'rows', 'hashing'],
+                        choices=['redaction', 'rows', 'hashing'])
+    parser.add_argument('--costs', type=lambda s: tuple(
+        int(c) for c in s.split(',')), default=BCRYPT_COSTS)
+    parser.add_argument('--rows', type=int, default=ROWS)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+    if args.compare:
+        runs = []
+        for file_path in args.compare:
+            with open(file_path, 'r') as f:
+                runs.append(json.load(f))
+        sys.exit(1 if compare(runs[0], runs[1], args.threshold) else 0)
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
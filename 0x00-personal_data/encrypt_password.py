@@ -4,18 +4,112 @@
 Module to encrypt password
 """
 
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple
+
 import bcrypt
 
+WORKERS = os.cpu_count() or 1
+DEFAULT_COST = 12
+TARGET_MS = 250
+_cost = None
+
+
+def get_cost() -> int:
+    """
+    Configured bcrypt work factor
+    BCRYPT_ROUNDS wins over the calibrated value in BCRYPT_CONFIG.
+    Returns:
+        int: cost
+    """
+    global _cost
+    if _cost is None:
+        rounds = os.getenv('BCRYPT_ROUNDS')
+        if rounds is None:
+            config = os.getenv('BCRYPT_CONFIG', '.bcrypt.json')
+            try:
+                with open(config, 'r') as f:
+                    rounds = json.load(f)['rounds']
+            except (OSError, ValueError, KeyError):
+                rounds = DEFAULT_COST
+        _cost = int(rounds)
+    return _cost
+
+
+def save_cost(cost: int) -> None:
+    """
+    Store a work factor in BCRYPT_CONFIG
+    Args:
+        int: cost
+    """
+    global _cost
+    config = os.getenv('BCRYPT_CONFIG', '.bcrypt.json')
+    with open(config, 'w') as f:
+        json.dump({'rounds': cost}, f)
+    _cost = cost
+
+
+def calibrate_cost(
+    target_ms: float = TARGET_MS, min_cost: int = 4, max_cost: int = 16
+) -> int:
+    """
+    Highest work factor whose verify time stays under target_ms
+    Args:
+        float: target_ms
+        int: min_cost
+        int: max_cost
+    Returns:
+        int: cost
+    """
+    password = b'calibration password'
+    cost = min_cost
+    while cost < max_cost:
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(cost + 1))
+        start = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        cost += 1
+    return cost
+
+
+def hash_cost(hashed_password: bytes) -> int:
+    """
+    Work factor a hash was made with
+    Args:
+        bytes: hashed_password
+    Returns:
+        int: cost
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Check if a hash differs from the configured work factor
+    Args:
+        bytes: hashed_password
+    Returns:
+        bool: True if it should be rehashed
+    """
+    return hash_cost(hashed_password) != get_cost()
+
 
-def hash_password(password: str) -> bytes:
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hash password using random salt.
     Args:
         str: password
+        int: rounds, defaults to get_cost()
     Returns:
         bytes: password hash
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    salt = bcrypt.gensalt(rounds or get_cost())
+    return bcrypt.hashpw(password.encode('utf-8'), salt)
 
 
 def is_valid(hashed_password: bytes, password: str) -> bool:
@@ -28,3 +122,73 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         bool: If hashed True else False
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    is_valid for a (hashed_password, password) pair
+    """
+    return is_valid(*pair)
+
+
+def _ordered_map(
+    func: Callable, items: Iterable, workers: int, processes: bool
+) -> Iterator:
+    """
+    Map func over items on a pool, yielding results in input order
+    Args:
+        Callable: func
+        Iterable: items
+        int: workers
+        bool: processes, use processes instead of threads
+    Returns:
+        Iterator: results
+    """
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    pending = deque()
+    with executor(max_workers=workers) as pool:
+        for item in items:
+            pending.append(pool.submit(func, item))
+            # keep a bounded window in flight so large inputs stream
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def hash_passwords(
+    passwords: Iterable[str], workers: int = None, processes: bool = False
+) -> Iterator[bytes]:
+    """
+    Hash many passwords across a pool, bcrypt releases the GIL
+    Args:
+        Iterable[str]: passwords
+        int: workers, defaults to WORKERS
+        bool: processes, use a process pool instead of threads
+    Returns:
+        Iterator[bytes]: password hashes in input order
+    """
+    return _ordered_map(hash_password, passwords, workers or WORKERS,
+                        processes)
+
+
+def verify_many(
+    pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+    processes: bool = False
+) -> Iterator[bool]:
+    """
+    Check many (hashed_password, password) pairs across a pool
+    Args:
+        Iterable[Tuple[bytes, str]]: pairs
+        int: workers, defaults to WORKERS
+        bool: processes, use a process pool instead of threads
+    Returns:
+        Iterator[bool]: results in input order
+    """
+    return _ordered_map(_is_valid_pair, pairs, workers or WORKERS,
+                        processes)
+
+
+if __name__ == '__main__':
+    save_cost(calibrate_cost())
+    print('bcrypt cost: {}'.format(get_cost()))
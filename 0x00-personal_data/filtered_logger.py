@@ -6,15 +6,134 @@ Module to filter logs
 
 import os
 import re
+import sys
+import time
+import atexit
 import logging
+import sqlite3
+import threading
+import weakref
 import mysql.connector
-from typing import List
+from collections.abc import Mapping
+from contextlib import closing, contextmanager
+from copy import copy
+from functools import lru_cache
+from logging.handlers import QueueHandler
+from queue import Empty, Full, Queue
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 
 patterns = {
     'extract': lambda x, y: r'(?P<field>{})=[^{}]*'.format('|'.join(x), y),
     'replace': lambda x: r'\g<field>={}'.format(x)
 }
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
+REDACTOR_CACHE_SIZE = 128
+EXPORT_FIELDS = 'name,email,phone,ssn,password,ip,last_login,user_agent'
+EXPORT_BATCH_SIZE = 1000
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 256
+# redacted messages per record & redactor, shared by every handler
+REDACTED = weakref.WeakKeyDictionary()
+
+
+class Redactor:
+    """
+    Compiled redaction pattern for a set of fields
+    """
+
+    def __init__(
+        self, fields: Tuple[str, ...], redaction: str, separator: str
+    ) -> None:
+        """
+        Compile the extract pattern once
+        Args:
+            Tuple[str, ...]: fields
+            str: redaction
+            str: separator
+        """
+        extract, replace = (patterns['extract'], patterns['replace'])
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self._pattern = re.compile(extract(fields, separator))
+        self._replace = replace(redaction)
+
+    def redact(self, message: str) -> str:
+        """
+        Redact fields in message
+        Args:
+            str: message
+        Returns:
+            str: redacted message
+        """
+        return self._pattern.sub(self._replace, message)
+
+
+@lru_cache(maxsize=REDACTOR_CACHE_SIZE)
+def get_redactor(
+    fields: Tuple[str, ...], redaction: str, separator: str
+) -> Redactor:
+    """
+    Fetch a compiled redactor, building it on first use
+    Args:
+        Tuple[str, ...]: fields
+        str: redaction
+        str: separator
+    Returns:
+        Redactor: cached redactor
+    """
+    return Redactor(fields, redaction, separator)
+
+
+class ColumnRedactor:
+    """
+    Redact tabular records by column instead of by regex
+    """
+
+    def __init__(
+        self, columns: List[str], fields: Tuple[str, ...], redaction: str
+    ) -> None:
+        """
+        Bake the masked columns into a row template
+        Args:
+            List[str]: columns
+            Tuple[str, ...]: fields
+            str: redaction
+        """
+        self.columns = tuple(columns)
+        self.kept = tuple(i for i, c in enumerate(self.columns)
+                          if c not in fields)
+        parts = []
+        for column in self.columns:
+            value = '{}' if column not in fields else redaction.replace(
+                '{', '{{').replace('}', '}}')
+            parts.append('{}={}'.format(column, value))
+        self.template = '{};'.format('; '.join(parts))
+
+    def format_rows(self, rows: Iterable[Sequence]) -> Iterator[str]:
+        """
+        Render row tuples, masked columns are never read
+        Args:
+            Iterable[Sequence]: rows
+        Returns:
+            Iterator[str]: redacted messages
+        """
+        render, kept = self.template.format, self.kept
+        for row in rows:
+            yield render(*[row[i] for i in kept])
+
+    def format_columns(self, batch: Sequence[Sequence]) -> Iterator[str]:
+        """
+        Render a column-major batch (lists, arrays...)
+        Args:
+            Sequence[Sequence]: batch, one sequence per column
+        Returns:
+            Iterator[str]: redacted messages
+        """
+        render = self.template.format
+        if not self.kept:
+            return (render() for _ in range(len(batch[0]) if batch else 0))
+        return (render(*row) for row in zip(*[batch[i] for i in self.kept]))
 
 
 def filter_datum(
@@ -30,64 +149,330 @@ def filter_datum(
     Returns:
         str: formatted data
     """
-    extract, replace = (patterns['extract'], patterns['replace'])
-    return re.sub(extract(fields, separator), replace(redaction), message)
+    return get_redactor(tuple(fields), redaction, separator).redact(message)
 
 
-def get_logger() -> logging.Logger:
+def get_logger(asynchronous: bool = None) -> logging.Logger:
     """
-    Create new logger for user data
+    Create new logger for user data, set up on the first call only
+    so later calls add no handler or listener thread
+    Args:
+        bool: asynchronous, defaults to PERSONAL_DATA_LOG_ASYNC
     Returns:
         logging.Logger: Log record
     """
+    if asynchronous is None:
+        asynchronous = os.getenv('PERSONAL_DATA_LOG_ASYNC', '0') == '1'
     logger = logging.getLogger('user_data')
+    if logger.handlers:
+        return logger
     stream_handler = logging.StreamHandler()
     stream_handler.setFormatter(RedactingFormatter(PII_FIELDS))
     logger.setLevel(logging.INFO)
     logger.propagate = False
-    logger.addHandler(stream_handler)
+    if not asynchronous:
+        logger.addHandler(stream_handler)
+        return logger
+    queue_size = int(os.getenv('PERSONAL_DATA_LOG_QUEUE_SIZE',
+                               LOG_QUEUE_SIZE))
+    block = os.getenv('PERSONAL_DATA_LOG_POLICY', 'drop') == 'block'
+    log_queue = Queue(maxsize=queue_size)
+    queue_handler = BoundedQueueHandler(log_queue, block)
+    queue_handler.listener = BatchingListener(log_queue, stream_handler)
+    queue_handler.listener.start()
+    atexit.register(queue_handler.listener.stop)
+    logger.addHandler(queue_handler)
     return logger
 
 
+class MySQLBackend:
+    """
+    DB-API backend for mysql
+    """
+
+    def connect(self) -> mysql.connector.connection.MySQLConnection:
+        """
+        Open a new connection from PERSONAL_DATA_DB_* settings
+        """
+        return mysql.connector.connect(
+            host=os.getenv('PERSONAL_DATA_DB_HOST', 'localhost'),
+            port=int(os.getenv('PERSONAL_DATA_DB_PORT', '3306')),
+            user=os.getenv('PERSONAL_DATA_DB_USERNAME', 'root'),
+            password=os.getenv('PERSONAL_DATA_DB_PASSWORD', ''),
+            database=os.getenv('PERSONAL_DATA_DB_NAME', '')
+        )
+
+
+class SQLiteBackend:
+    """
+    DB-API backend for a local sqlite file
+    """
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open PERSONAL_DATA_DB_NAME as a sqlite database
+        """
+        db_name = os.getenv('PERSONAL_DATA_DB_NAME', '') or ':memory:'
+        return sqlite3.connect(db_name, check_same_thread=False)
+
+
+DB_BACKENDS = {'mysql': MySQLBackend, 'sqlite': SQLiteBackend}
+
+
+def get_backend():
+    """
+    Backend selected by PERSONAL_DATA_DB_BACKEND
+    """
+    name = os.getenv('PERSONAL_DATA_DB_BACKEND', 'mysql')
+    return DB_BACKENDS[name]()
+
+
 def get_db() -> mysql.connector.connection.MySQLConnection:
     """
-    Create a mysql connection to database
+    Create a connection to the configured database
     """
-    db_host = os.getenv('PERSONAL_DATA_DB_HOST', 'localhost')
-    db_name = os.getenv('PERSONAL_DATA_DB_NAME', '')
-    db_user = os.getenv('PERSONAL_DATA_DB_USERNAME', 'root')
-    db_pass = os.getenv('PERSONAL_DATA_DB_PASSWORD', '')
-    connection = mysql.connector.connect(
-        host=db_host,
-        port=3306,
-        user=db_user,
-        password=db_pass,
-        database=db_name
-    )
-    return connection
+    return get_backend().connect()
 
 
-def entryPoint():
+class ConnectionPool:
     """
-    Log information about user
+    Pool of reusable DB-API connections
     """
-    fields = 'name,email,phone,ssn,password,ip,last_login,user_agent'
-    columns = fields.split(',')
-    query = 'SELECT {} FROM users'.format(fields)
-    logger = get_logger()
-    conn = get_db()
-    with conn.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        for row in rows:
-            record = map(
-                lambda x: '{}={}'.format(x[0], x[1]),
-                zip(columns, row)
+
+    def __init__(
+        self, connect, size: int = 5, overflow: int = 5,
+        idle_timeout: float = 300
+    ) -> None:
+        """
+        Init method for class
+        Args:
+            callable: connect, opens a new connection
+            int: size, connections kept idle
+            int: overflow, extra connections allowed under load
+            float: idle_timeout, seconds before an idle one is closed
+        """
+        self._connect = connect
+        self.size = size
+        self.overflow = overflow
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self.created = 0
+        self.closed = 0
+        self.waits = 0
+
+    def acquire(self):
+        """
+        Borrow a connection, waiting when the pool is exhausted
+        """
+        with self._cond:
+            while True:
+                self._expire()
+                if self._idle:
+                    return self._idle.pop()[0]
+                if self._open < self.size + self.overflow:
+                    self._open += 1
+                    break
+                self.waits += 1
+                self._cond.wait()
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        self.created += 1
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        """
+        Return a borrowed connection, rolled back so the next
+        borrower does not read the open transaction's snapshot
+        Args:
+            conn: connection
+            bool: discard, close it instead of keeping it
+        """
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self._cond:
+            if discard or len(self._idle) >= self.size:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        self.release(conn)
+
+    def stats(self) -> dict:
+        """
+        Counters for the pool
+        Returns:
+            dict: open, idle, in use & lifetime counters
+        """
+        with self._cond:
+            return {'size': self.size, 'overflow': self.overflow,
+                    'open': self._open, 'idle': len(self._idle),
+                    'in_use': self._open - len(self._idle),
+                    'created': self.created, 'closed': self.closed,
+                    'waits': self.waits}
+
+    def close(self) -> None:
+        """Close every idle connection"""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+
+    def _expire(self) -> None:
+        """Close connections idle for longer than idle_timeout"""
+        limit = time.monotonic() - self.idle_timeout
+        while self._idle and self._idle[0][1] < limit:
+            self._close(self._idle.pop(0)[0])
+
+    def _close(self, conn) -> None:
+        """Close a connection & forget it"""
+        self._open -= 1
+        self.closed += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Shared pool configured through PERSONAL_DATA_DB_POOL_* env vars
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                get_backend().connect,
+                size=int(os.getenv('PERSONAL_DATA_DB_POOL_SIZE', '5')),
+                overflow=int(os.getenv('PERSONAL_DATA_DB_POOL_OVERFLOW',
+                                       '5')),
+                idle_timeout=float(os.getenv(
+                    'PERSONAL_DATA_DB_POOL_IDLE_TIMEOUT', '300'))
             )
-            msg = '{};'.format('; '.join(list(record)))
+        return _pool
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection
+    """
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def stream_rows(cursor, batch_size: int) -> Iterator[tuple]:
+    """
+    Pull rows from an executed cursor in fetchmany batches
+    Args:
+        cursor: DB-API cursor
+        int: batch_size
+    Returns:
+        Iterator[tuple]: rows
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+def format_rows(
+    columns: List[str], rows: Iterable[tuple]
+) -> Iterator[str]:
+    """
+    Build a key=value; message per row
+    Args:
+        List[str]: columns
+        Iterable[tuple]: rows
+    Returns:
+        Iterator[str]: messages
+    """
+    for row in rows:
+        record = map(
+            lambda x: '{}={}'.format(x[0], x[1]),
+            zip(columns, row)
+        )
+        yield '{};'.format('; '.join(record))
+
+
+def export_users(
+    conn, logger: logging.Logger, batch_size: int = None,
+    column_aware: bool = True
+) -> Tuple[int, float]:
+    """
+    Stream the users table through the logger in constant memory
+    Args:
+        conn: DB-API connection
+        logging.Logger: logger
+        int: batch_size
+        bool: column_aware, redact by column before formatting
+    Returns:
+        Tuple[int, float]: rows emitted & rows per second
+    """
+    if batch_size is None:
+        batch_size = int(os.getenv('PERSONAL_DATA_BATCH_SIZE',
+                                   EXPORT_BATCH_SIZE))
+    columns = EXPORT_FIELDS.split(',')
+    query = 'SELECT {} FROM users'.format(EXPORT_FIELDS)
+    count = 0
+    start = time.perf_counter()
+    # default mysql cursors are unbuffered, rows stay server side
+    with closing(conn.cursor()) as cursor:
+        cursor.execute(query)
+        rows = stream_rows(cursor, batch_size)
+        if column_aware:
+            redactor = ColumnRedactor(columns, PII_FIELDS,
+                                      RedactingFormatter.REDACTION)
+            messages = redactor.format_rows(rows)
+        else:
+            messages = format_rows(columns, rows)
+        for msg in messages:
             args = ('user_data', logging.INFO, None, None, msg, None, None)
-            log_entry = logging.LogRecord(*args)
-            logger.handle(log_entry)
+            record = logging.LogRecord(*args)
+            if column_aware:
+                # already masked, flagged by identity so extra= cannot
+                # skip redaction by accident
+                record._redacted_by = ColumnRedactor
+            logger.handle(record)
+            count += 1
+    elapsed = time.perf_counter() - start
+    return count, (count / elapsed if elapsed > 0 else 0.0)
+
+
+def entryPoint():
+    """
+    Log information about user
+    """
+    with db_connection() as conn:
+        count, rate = export_users(conn, get_logger())
+    print('{} rows exported ({:.0f} rows/sec)'.format(count, rate),
+          file=sys.stderr)
 
 
 class RedactingFormatter(logging.Formatter):
@@ -105,12 +490,187 @@ class RedactingFormatter(logging.Formatter):
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.masked = frozenset(fields)
+        self.redactor = get_redactor(tuple(fields), self.REDACTION,
+                                     self.SEPARATOR)
 
     def format(self, record: logging.LogRecord) -> str:
-        """Format a log Record"""
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
-        return super().format(record)
+        """Format a log Record, leaving the record untouched"""
+        redacted = copy(record)
+        redacted.msg, redacted.args = self.redact_message(record), None
+        return super().format(redacted)
+
+    def redact_message(self, record: logging.LogRecord) -> str:
+        """
+        Redacted message of a record, computed once per field set
+        Args:
+            logging.LogRecord: record
+        Returns:
+            str: redacted message
+        """
+        if getattr(record, '_redacted_by', None) is ColumnRedactor:
+            return record.getMessage()
+        cache = REDACTED.get(record)
+        if cache is None:
+            cache = REDACTED.setdefault(record, {})
+        message = cache.get(self.redactor)
+        if message is None:
+            fields = structured_fields(record)
+            if fields is None:
+                message = record.getMessage()
+            else:
+                message = self.render_fields(record.msg, fields)
+            # the message text may hold PII the fields do not
+            message = self.redactor.redact(message)
+            cache[self.redactor] = message
+        return message
+
+    def render_fields(self, msg: str, fields: Mapping) -> str:
+        """
+        Render structured fields as key=value; masking by key, or
+        interpolate them into a msg with %(key)s placeholders
+        Args:
+            str: msg, optional prefix or %-format
+            Mapping: fields
+        Returns:
+            str: redacted message
+        """
+        masked, redaction = self.masked, self.REDACTION
+        if isinstance(msg, str) and '%(' in msg:
+            return msg % {k: redaction if k in masked else v
+                          for k, v in fields.items()}
+        line = '{};'.format('; '.join(
+            '{}={}'.format(k, redaction if k in masked else v)
+            for k, v in fields.items()))
+        return '{} {}'.format(msg, line) if msg else line
+
+
+def structured_fields(record: logging.LogRecord) -> Optional[Mapping]:
+    """
+    Fields passed through extra={'fields': ...} or a mapping as args
+    Args:
+        logging.LogRecord: record
+    Returns:
+        Mapping: fields or None for plain messages
+    """
+    fields = getattr(record, 'fields', None)
+    if isinstance(fields, Mapping):
+        return fields
+    if isinstance(record.args, Mapping):
+        return record.args
+    return None
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler that hands raw records to a listener thread
+    """
+
+    def __init__(self, log_queue: Queue, block: bool = False) -> None:
+        """
+        Init method for class
+        Args:
+            Queue: log_queue, bounded
+            bool: block when full instead of dropping
+        """
+        super(BoundedQueueHandler, self).__init__(log_queue)
+        self.block = block
+        self.dropped = 0
+        self.listener = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Leave formatting & redaction to the listener"""
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """Queue a record, applying the drop/block policy"""
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+    def stats(self) -> dict:
+        """
+        Counters for the pipeline
+        Returns:
+            dict: queue depth, dropped & written records
+        """
+        written = self.listener.written if self.listener else 0
+        return {'depth': self.queue.qsize(), 'dropped': self.dropped,
+                'written': written}
+
+
+class BatchingListener:
+    """
+    Background thread formatting queued records in batches
+    """
+    _sentinel = None
+
+    def __init__(
+        self, log_queue: Queue, handler: logging.StreamHandler,
+        batch_size: int = LOG_BATCH_SIZE
+    ) -> None:
+        """
+        Init method for class
+        Args:
+            Queue: log_queue
+            logging.StreamHandler: handler owning formatter & stream
+            int: batch_size
+        """
+        self.queue = log_queue
+        self.handler = handler
+        self.batch_size = batch_size
+        self.written = 0
+        self._thread = None
+
+    def start(self) -> None:
+        """Start the listener thread"""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Drain the queue & stop the listener thread"""
+        if self._thread is None:
+            return
+        self.queue.put(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        """Pull records & write each batch with a single call"""
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Empty:
+                    break
+            if self._sentinel in batch:
+                running = False
+                batch = [r for r in batch if r is not self._sentinel]
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[logging.LogRecord]) -> None:
+        """Format a batch & write it out"""
+        handler = self.handler
+        lines = []
+        for record in batch:
+            try:
+                lines.append(handler.format(record))
+            except Exception:
+                handler.handleError(record)
+        if not lines:
+            return
+        terminator = handler.terminator
+        with handler.lock:
+            handler.stream.write(terminator.join(lines) + terminator)
+            handler.flush()
+        self.written += len(lines)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""
+Module to redact large csv dumps across a process pool
+"""
+
+import argparse
+import csv
+import io
+import mmap
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import Iterator, List, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter
+
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def chunk_bounds(
+    data: mmap.mmap, start: int, chunk_size: int
+) -> Iterator[Tuple[int, int]]:
+    """
+    Split data into chunks ending on record boundaries
+    Args:
+        mmap.mmap: data
+        int: start, offset of the first record
+        int: chunk_size
+    Returns:
+        Iterator[Tuple[int, int]]: (start, end) offsets
+    """
+    size = len(data)
+    while start < size:
+        end = min(start + chunk_size, size)
+        quotes = data[start:end].count(b'"')
+        while end < size:
+            newline = data.find(b'\n', end)
+            if newline == -1:
+                end = size
+                break
+            quotes += data[end:newline].count(b'"')
+            end = newline + 1
+            # an odd quote count means the newline sits in a quoted field
+            if quotes % 2 == 0:
+                break
+        yield start, end
+        start = end
+
+
+def redact_chunk(task: Tuple[str, int, int, List[int], str]) -> bytes:
+    """
+    Redact the columns of every record in a chunk
+    Args:
+        Tuple: path, start, end, column indices, redaction
+    Returns:
+        bytes: redacted csv records
+    """
+    path, start, end, indices, redaction = task
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode('utf-8')
+    out = io.StringIO()
+    writer = csv.writer(out, quoting=csv.QUOTE_ALL, lineterminator='\n')
+    for row in csv.reader(io.StringIO(text, newline='')):
+        for i in indices:
+            if i < len(row):
+                row[i] = redaction
+        writer.writerow(row)
+    return out.getvalue().encode('utf-8')
+
+
+def redact_file(
+    src: str, dst: str, fields: Tuple[str, ...] = PII_FIELDS,
+    workers: int = None, chunk_size: int = CHUNK_SIZE
+) -> Tuple[int, float]:
+    """
+    Redact a csv file, writing chunks back in order
+    Args:
+        str: src
+        str: dst
+        Tuple[str, ...]: fields
+        int: workers, defaults to the cpu count
+        int: chunk_size
+    Returns:
+        Tuple[int, float]: bytes read & seconds taken
+    """
+    begin = time.perf_counter()
+    size = os.path.getsize(src)
+    with open(dst, 'wb') as out:
+        if size == 0:
+            return 0, time.perf_counter() - begin
+        with open(src, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                header_end = data.find(b'\n') + 1 or size
+                header = data[:header_end]
+                bounds = list(chunk_bounds(data, header_end, chunk_size))
+        out.write(header)
+        columns = next(csv.reader([header.decode('utf-8')]))
+        indices = [i for i, name in enumerate(columns) if name in fields]
+        tasks = [(src, start, end, indices, RedactingFormatter.REDACTION)
+                 for start, end in bounds]
+        with Pool(workers) as pool:
+            for chunk in pool.imap(redact_chunk, tasks):
+                out.write(chunk)
+    return size, time.perf_counter() - begin
+
+
+def main() -> None:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('src')
+    parser.add_argument('dst')
+    parser.add_argument('-w', '--workers', type=int, default=None)
+    parser.add_argument('-c', '--chunk-size', type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+    size, elapsed = redact_file(args.src, args.dst, workers=args.workers,
+                                chunk_size=args.chunk_size)
+    rate = size / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+    print('{} bytes redacted in {:.2f}s ({:.1f} MB/s)'.format(
+        size, elapsed, rate), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,7 @@
 """
 from flask import jsonify, abort
 from api.v1.views import app_views
+from models.user import User
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -18,11 +19,12 @@ def status() -> str:
 def stats() -> str:
     """ GET /api/v1/stats
     Return:
-      - the number of each objects
+      - the number of each objects, the objects created & removed
+        by this worker since start
     """
-    from models.user import User
     stats = {}
     stats['users'] = User.count()
+    stats['models'] = {User.__name__: User.stats()}
     return jsonify(stats)
 
 
@@ -1,19 +1,61 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+import json
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
 from models.user import User
 
+STREAM_CHUNK = 64 * 1024
+
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters:
+      - limit (optional): page size, pages are ordered by created_at, id
+      - cursor (optional): X-Next-Cursor header of the previous page
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, streamed when no limit
+      - 400 if limit or cursor is invalid
+    """
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return Response(stream_users(User.all()),
+                        mimetype='application/json')
+    try:
+        limit = int(limit) if limit is not None else 100
+        if limit <= 0:
+            raise ValueError()
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    try:
+        users, next_cursor = User.page(limit, cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    reply = jsonify([user.to_json() for user in users])
+    if next_cursor is not None:
+        reply.headers['X-Next-Cursor'] = next_cursor
+    return reply
+
+
+def stream_users(users: list):
+    """ Yield a JSON array of users in chunks of about STREAM_CHUNK
+    bytes, one write per chunk rather than per user
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    chunk, size = ['['], 1
+    separator = ''
+    for user in users:
+        text = separator + json.dumps(user.serialized())
+        chunk.append(text)
+        size += len(text)
+        separator = ','
+        if size >= STREAM_CHUNK:
+            yield ''.join(chunk)
+            chunk, size = [], 0
+    chunk.append(']\n')
+    yield ''.join(chunk)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
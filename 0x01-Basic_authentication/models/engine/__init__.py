@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+""" Storage engines persisting the models
+"""
+from os import getenv
+
+
+def get_storage():
+    """ Storage engine selected by BASE_STORAGE: json (default) or sqlite,
+    behind a background writer when BASE_DURABILITY is async
+    """
+    if getenv('BASE_STORAGE', 'json') == 'sqlite':
+        from models.engine.sqlite_storage import SQLiteStorage
+        storage = SQLiteStorage(getenv('BASE_SQLITE_PATH', '.db.sqlite3'))
+    else:
+        from models.engine.json_storage import JSONStorage
+        storage = JSONStorage(getenv('BASE_JOURNAL', '0') == '1',
+                              int(getenv('BASE_JOURNAL_COMPACT', '1000')))
+    if getenv('BASE_DURABILITY', 'sync') == 'async':
+        from models.engine.group_commit import GroupCommitStorage
+        delay = int(getenv('BASE_COMMIT_DELAY_MS', '50')) / 1000
+        storage = GroupCommitStorage(storage, delay)
+    return storage
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+""" JSON file storage engine
+"""
+from os import (
+    SEEK_END, fstat, fsync, getpid, path, pread, remove, replace, stat
+)
+from typing import Dict, Iterator, List, Optional, Tuple, TypeVar
+import fcntl
+import json
+import threading
+
+from models.engine.storage import Storage
+
+
+class JSONStorage(Storage):
+    """ Objects in .db_<Class>.json, one object per line,
+    with an optional append-only .db_<Class>.journal
+
+    Classes with journaled set always use the journal.
+    Every process remembers the snapshot it loaded (inode, mtime &
+    size) and how far it read the journal, so changes() only reads
+    what other processes appended, or reloads after a rewrite.
+    Journal appends & compaction hold an exclusive flock, and a
+    process only compacts once it has read the whole journal.
+    """
+
+    def __init__(self, journal: bool = False, compact_every: int = 1000):
+        """ Initialize the engine
+        """
+        self.journal = journal
+        self.compact_every = compact_every
+        self.sizes = {}
+        self.snapshots = {}
+        self.positions = {}
+        self.lock = threading.RLock()
+
+    @staticmethod
+    def paths(cls: type) -> Tuple[str, str]:
+        """ Snapshot & journal file of a class
+        """
+        return (".db_{}.json".format(cls.__name__),
+                ".db_{}.journal".format(cls.__name__))
+
+    def uses_journal(self, cls: type) -> bool:
+        """ Whether saves of a class are appended to its journal
+        """
+        return self.journal or cls.journaled
+
+    @staticmethod
+    def signature(file_path: str) -> Optional[Tuple[int, int, int]]:
+        """ Inode, mtime & size of a file, None when it does not exist
+        """
+        try:
+            result = stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (result.st_ino, result.st_mtime_ns, result.st_size)
+
+    def load(self, cls: type) -> Iterator[Tuple[str, object]]:
+        """ Stream the snapshot then replay the journal
+        Snapshots written one object per line are streamed,
+        older single-line files are parsed whole.
+        """
+        file_path = self.paths(cls)[0]
+        s_class = cls.__name__
+        self.sizes[s_class] = 0
+        self.snapshots[s_class] = None
+        self.positions[s_class] = (None, 0)
+        if path.exists(file_path):
+            with open(file_path, 'r') as f:
+                info = fstat(f.fileno())
+                self.snapshots[s_class] = (info.st_ino, info.st_mtime_ns,
+                                           info.st_size)
+                if f.readline().strip() == '{':
+                    for line in f:
+                        line = line.rstrip().rstrip(',')
+                        if line == '' or line == '}':
+                            continue
+                        entry = json.loads('{' + line + '}')
+                        for obj_json in entry.values():
+                            yield 'save', obj_json
+                else:
+                    f.seek(0)
+                    for obj_json in json.load(f).values():
+                        yield 'save', obj_json
+        yield from self.tail(cls)
+
+    def tail(self, cls: type) -> Iterator[Tuple[str, object]]:
+        """ Journal entries after the last position read
+        A line without its newline is still being written & is left
+        for later, a line that does not parse was torn by a crashed
+        writer & is skipped.
+        """
+        s_class = cls.__name__
+        offset = self.positions.get(s_class, (None, 0))[1]
+        try:
+            f = open(self.paths(cls)[1], 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            inode = fstat(f.fileno()).st_ino
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    break
+                offset += len(raw)
+                self.positions[s_class] = (inode, offset)
+                try:
+                    entry = json.loads(raw)
+                except ValueError:
+                    continue
+                self.sizes[s_class] = self.sizes.get(s_class, 0) + 1
+                if entry['op'] == 'save':
+                    yield 'save', entry['obj']
+                else:
+                    yield 'remove', entry['id']
+            self.positions[s_class] = (inode, offset)
+
+    def changes(self, cls: type) -> Optional[List[Tuple[str, object]]]:
+        """ Journal entries appended since load or the last call,
+        or the whole stored state when the snapshot was rewritten
+        """
+        file_path, journal_path = self.paths(cls)
+        s_class = cls.__name__
+        with self.lock:
+            if self.signature(file_path) != self.snapshots.get(s_class):
+                return self.reload(cls)
+            inode, offset = self.positions.get(s_class, (None, 0))
+            journal = self.signature(journal_path)
+            if journal is None:
+                return None
+            if inode is not None and journal[0] != inode:
+                return self.reload(cls)
+            if journal[2] == offset:
+                return None
+            return list(self.tail(cls))
+
+    def reload(self, cls: type) -> List[Tuple[str, object]]:
+        """ Whole stored state, ending with the ids it holds
+        """
+        entries, ids = list(self.load(cls)), set()
+        for op, value in entries:
+            if op == 'save':
+                ids.add(value['id'])
+            else:
+                ids.discard(value)
+        entries.append(('retain', ids))
+        return entries
+
+    def locked_journal(self, cls: type):
+        """ Journal opened for append under an exclusive flock,
+        reopened if another process compacted it away meanwhile
+        """
+        while True:
+            f = open(self.paths(cls)[1], 'a+b')
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            if fstat(f.fileno()).st_nlink > 0:
+                return f
+            f.close()
+
+    def commit(
+        self, cls: type, changes: Dict[str, Optional[TypeVar('Base')]],
+        objs: Dict[str, TypeVar('Base')]
+    ):
+        """ Append the changes to the journal, compacting every
+        compact_every entries, or rewrite the snapshot without one
+        """
+        if not self.uses_journal(cls):
+            self.flush(cls, objs)
+            return
+        lines = []
+        for obj_id, obj in changes.items():
+            if obj is None:
+                lines.append(json.dumps({'op': 'remove', 'id': obj_id}))
+            else:
+                lines.append(
+                    '{{"op": "save", "obj": {}}}'.format(obj.dumps()))
+        data = ('\n'.join(lines) + '\n').encode()
+        s_class = cls.__name__
+        with self.lock, self.locked_journal(cls) as f:
+            end = f.seek(0, SEEK_END)
+            if end and pread(f.fileno(), 1, end - 1) != b'\n':
+                # close the line a crashed writer left unfinished
+                data = b'\n' + data
+            f.write(data)
+            f.flush()
+            inode = fstat(f.fileno()).st_ino
+            known, offset = self.positions.get(s_class, (None, 0))
+            caught_up = offset == end and known in (None, inode) and \
+                self.signature(self.paths(cls)[0]) == \
+                self.snapshots.get(s_class)
+            if caught_up:
+                self.positions[s_class] = (inode, end + len(data))
+            self.sizes[s_class] = self.sizes.get(s_class, 0) + len(lines)
+            # objs misses what others appended until it is read back
+            if caught_up and self.sizes[s_class] >= self.compact_every:
+                self.write(cls, objs)
+
+    def flush(self, cls: type, objs: Dict[str, TypeVar('Base')]):
+        """ Replace the snapshot & drop the journal
+        """
+        if not self.uses_journal(cls):
+            with self.lock:
+                self.write(cls, objs)
+            return
+        with self.lock, self.locked_journal(cls):
+            self.write(cls, objs)
+
+    def write(self, cls: type, objs: Dict[str, TypeVar('Base')]):
+        """ Write a snapshot of objs to a temp file, fsync it,
+        rename it over the old one & drop the journal
+        """
+        file_path, journal_path = self.paths(cls)
+        tmp_path = '{}.{}.tmp'.format(file_path, getpid())
+        # copied under the GIL, saves from other threads can go on
+        objs = dict(objs)
+        with open(tmp_path, 'w') as f:
+            f.write('{')
+            separator = '\n'
+            for obj_id, obj in objs.items():
+                f.write('{}{}: {}'.format(
+                    separator, json.dumps(obj_id), obj.dumps()))
+                separator = ',\n'
+            f.write('\n}\n')
+            f.flush()
+            fsync(f.fileno())
+            info = fstat(f.fileno())
+        replace(tmp_path, file_path)
+        if path.exists(journal_path):
+            remove(journal_path)
+        s_class = cls.__name__
+        self.snapshots[s_class] = (info.st_ino, info.st_mtime_ns,
+                                   info.st_size)
+        self.positions[s_class] = (None, 0)
+        self.sizes[s_class] = 0
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+""" Query module
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from heapq import nlargest, nsmallest
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+import operator
+
+from models.base import DATA, INDEXES, TIMESTAMP_FORMAT
+
+COMPARISONS = {'gt': operator.gt, 'gte': operator.ge,
+               'lt': operator.lt, 'lte': operator.le}
+OPERATORS = ('eq', 'in', 'prefix') + tuple(COMPARISONS)
+
+
+def compile_condition(attr: str, op: str, value) -> Callable:
+    """ Predicate of one condition, built once per query
+    """
+    if op == 'eq':
+        getter = operator.attrgetter(attr)
+
+        def match(obj):
+            try:
+                return getter(obj) == value
+            except AttributeError:
+                return False
+        return match
+    if op == 'in':
+        try:
+            values = frozenset(value)
+        except TypeError:
+            values = list(value)
+        return lambda obj: getattr(obj, attr, None) in values
+    if op == 'prefix':
+        def match(obj):
+            current = getattr(obj, attr, None)
+            return isinstance(current, str) and current.startswith(value)
+        return match
+    compare = COMPARISONS[op]
+
+    def match(obj):
+        current = getattr(obj, attr, None)
+        return current is not None and compare(current, value)
+    return match
+
+
+class Query():
+    """ Lazy query over the objects of a class
+
+    Conditions are (attribute, operator, value), operators being
+    eq, in, prefix & the gt/gte/lt/lte ranges. Candidates come from
+    the smallest usable index: the hash index of an indexed attribute
+    for eq/in, the created_at sorted index for created_at ranges,
+    every object otherwise. Iteration stops as soon as limit is met.
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize an empty query
+        """
+        self.cls = cls
+        self.conditions = []
+        self.predicates = []
+        self.order = None
+        self.descending = False
+        self.max = None
+
+    def where(self, attr: str, op: str = 'eq', value=None) -> 'Query':
+        """ Add a condition, all conditions must hold
+        Raises ValueError on an unknown operator
+        """
+        if op not in OPERATORS:
+            raise ValueError('Unknown operator: {}'.format(op))
+        self.conditions.append((attr, op, value))
+        self.predicates.append(compile_condition(attr, op, value))
+        return self
+
+    def filter(self, **conditions: dict) -> 'Query':
+        """ Add conditions given as attr=value or attr__op=value
+        """
+        for key, value in conditions.items():
+            attr, _, op = key.partition('__')
+            self.where(attr, op or 'eq', value)
+        return self
+
+    def order_by(self, attr: str) -> 'Query':
+        """ Sort by an attribute, descending when prefixed by '-'
+        """
+        self.descending = attr.startswith('-')
+        self.order = attr.lstrip('-')
+        return self
+
+    def limit(self, count: int) -> 'Query':
+        """ Stop after count objects
+        """
+        self.max = count
+        return self
+
+    def candidates(self) -> Tuple[Iterator[TypeVar('Base')], bool]:
+        """ Objects worth testing, from the smallest usable index,
+        and whether they come sorted by created_at
+        """
+        s_class = self.cls.__name__
+        indexes = INDEXES.get(s_class, {})
+        best = None
+        size = len(DATA[s_class])
+        low, high, ranged = None, None, False
+        for attr, op, value in self.conditions:
+            if attr in indexes and op in ('eq', 'in'):
+                try:
+                    if op == 'eq':
+                        objs = self.cls.lookup(attr, value)
+                    else:
+                        objs = {}
+                        for v in value:
+                            for obj in self.cls.lookup(attr, v):
+                                objs[obj.id] = obj
+                        objs = list(objs.values())
+                except TypeError:
+                    continue
+                if len(objs) < size:
+                    best, size = objs, len(objs)
+            elif attr == 'created_at' and op in COMPARISONS \
+                    and isinstance(value, datetime):
+                ranged = True
+                key = value.strftime(TIMESTAMP_FORMAT)
+                if op in ('gt', 'gte'):
+                    low = key if low is None else max(low, key)
+                else:
+                    high = key if high is None else min(high, key)
+        if ranged or (best is None and self.order == 'created_at'):
+            ordered = self.cls.ordered()
+            start = 0 if low is None else bisect_left(ordered, (low,))
+            end = len(ordered) if high is None else \
+                bisect_right(ordered, (high, '\uffff'))
+            if best is None or end - start < size:
+                # timestamps are kept to the second, predicates
+                # still check the exact bounds
+                keys = ordered[start:end]
+                if self.descending:
+                    keys = reversed(keys)
+                ids = (obj_id for _, obj_id in keys)
+                # objects removed by another thread meanwhile are skipped
+                found = map(DATA[s_class].get, ids)
+                return (obj for obj in found if obj is not None), True
+        if best is None:
+            best = list(DATA[s_class].values())
+        return iter(best), False
+
+    def __iter__(self) -> Iterator[TypeVar('Base')]:
+        """ Matching objects, ordered & limited
+        """
+        objs, by_created = self.candidates()
+        predicates = self.predicates
+        if len(predicates) == 1:
+            objs = filter(predicates[0], objs)
+        elif predicates:
+            objs = filter(
+                lambda obj: all(match(obj) for match in predicates), objs)
+        if self.order is not None and \
+                not (by_created and self.order == 'created_at'):
+            attr = self.order
+
+            def key(obj):
+                value = getattr(obj, attr, None)
+                return (value is not None, value)
+            if self.max is not None:
+                pick = nlargest if self.descending else nsmallest
+                return iter(pick(self.max, objs, key=key))
+            return iter(sorted(objs, key=key, reverse=self.descending))
+        if self.max is not None:
+            return islice(objs, self.max)
+        return objs
+
+    def all(self) -> List[TypeVar('Base')]:
+        """ Every matching object
+        """
+        return list(self)
+
+    def first(self) -> Optional[TypeVar('Base')]:
+        """ First matching object or None
+        """
+        return next(iter(self.limit(1)), None)
+
+    def count(self) -> int:
+        """ Number of matching objects
+        """
+        return sum(1 for _ in self)
@@ -3,6 +3,7 @@
 Route module for the API
 """
 from os import getenv
+import time
 from api.v1.views import app_views
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
@@ -11,6 +12,8 @@ from api.v1.auth.session_auth import SessionAuth
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from api.v1.auth.session_db_auth import SessionDBAuth
 from api.v1.auth.basic_auth import BasicAuth
+from models.user import User
+from models.user_session import UserSession
 app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
@@ -26,6 +29,8 @@ if auth_type == 'session_exp_auth':
     auth = SessionExpAuth()
 if auth_type == 'session_db_auth':
     auth = SessionDBAuth()
+refresh_interval = float(getenv('MODELS_REFRESH_INTERVAL', '1'))
+last_refresh = [time.monotonic()]
 
 
 @app.errorhandler(404)
@@ -57,6 +62,20 @@ excluded_paths = [
 ]
 
 
+@app.before_request
+def refresh_models():
+    """
+    Picks up models stored by other workers,
+    at most once per MODELS_REFRESH_INTERVAL seconds
+    """
+    now = time.monotonic()
+    if refresh_interval < 0 or now - last_refresh[0] < refresh_interval:
+        return
+    last_refresh[0] = now
+    User.refresh()
+    UserSession.refresh()
+
+
 @app.before_request
 def filter_request():
     """
@@ -88,14 +88,13 @@ class BasicAuth(Auth):
             return None
 
         try:
-            users_list = User.search({'email': user_email})
+            users = User.query(email=user_email)
+            for user in users:
+                if user.is_valid_password(user_pwd):
+                    return user
         except Exception:
             return None
 
-        for user in users_list:
-            if user.is_valid_password(user_pwd):
-                return user
-
         return None
     # Sure it overrides the other class though not correctly
 
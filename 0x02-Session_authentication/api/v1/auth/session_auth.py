@@ -4,16 +4,35 @@
 Session Authentication Module
 """
 
+from datetime import datetime
+from os import getenv
+from typing import Optional, Tuple
 from uuid import uuid4
 from .auth import Auth
+from .session_store import SessionStore
 from models.user import User
 
 
 class SessionAuth(Auth):
     """
     SessionAuth class to manage a session
+    Sessions live in a SessionStore of SESSION_STRIPES (16) stripes,
+    capped at SESSION_MAX (MAX_SESSIONS by default, 0 for no cap).
     """
-    user_id_by_session_id = {}
+    MAX_SESSIONS = 0
+
+    def __init__(self) -> None:
+        super().__init__()
+        try:
+            stripes = int(getenv('SESSION_STRIPES', '16'))
+        except Exception:
+            stripes = 16
+        try:
+            self.max_sessions = int(getenv('SESSION_MAX',
+                                           str(self.MAX_SESSIONS)))
+        except Exception:
+            self.max_sessions = self.MAX_SESSIONS
+        self.user_id_by_session_id = SessionStore(stripes, self.max_sessions)
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -25,10 +44,23 @@ class SessionAuth(Auth):
         """
         if user_id and isinstance(user_id, str):
             session_id = str(uuid4())
-            self.user_id_by_session_id[session_id] = user_id
+            value, expires_at = self.session_entry(user_id)
+            self.user_id_by_session_id.set(session_id, value, expires_at)
             return session_id
         return None
 
+    def session_entry(
+        self, user_id: str
+    ) -> Tuple[object, Optional[datetime]]:
+        """
+        Data stored for a new session
+        Args:
+            user_id: str
+        Returns:
+            Tuple: session data, expiry time or None for never
+        """
+        return user_id, None
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
         Fetch user id of specified session
@@ -64,6 +96,5 @@ class SessionAuth(Auth):
         user_id = self.user_id_for_session_id(session_id)
         if (request is None or session_id is None) or user_id is None:
             return False
-        if session_id in self.user_id_by_session_id:
-            del self.user_id_by_session_id[session_id]
+        self.user_id_by_session_id.pop(session_id)
         return True
@@ -8,14 +8,24 @@ from flask.app import timedelta
 
 from flask.json import datetime
 
+from typing import Optional
+from uuid import uuid4
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from models.user_session import UserSession
 
+CACHE_SIZE = 10000
+
 
 class SessionDBAuth(SessionExpAuth):
     """
     SessionAuth class to manage a session
+
+    Lookups go through the session_id index of UserSession, behind
+    the inherited SessionStore caching (user_id, UserSession id) for
+    up to SESSION_MAX (CACHE_SIZE) sessions. An entry serves until its
+    session expires, as long as the UserSession is still stored.
     """
+    MAX_SESSIONS = CACHE_SIZE
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -25,17 +35,32 @@ class SessionDBAuth(SessionExpAuth):
         Returns:
             user_id: str
         """
-        session_id = super().create_session(user_id)
         if user_id and isinstance(user_id, str):
+            session_id = str(uuid4())
             kwargs = {
                 'user_id': user_id,
                 'session_id': session_id
             }
             user_sess = UserSession(**kwargs)
             user_sess.save()
+            self.user_id_by_session_id.set(
+                session_id, (user_id, user_sess.id),
+                self.expires_at(user_sess))
             return session_id
         return None
 
+    def expires_at(self, session: UserSession) -> Optional[datetime]:
+        """
+        Expiry time of a stored session
+        Args:
+            session: UserSession
+        Returns:
+            datetime: expiry time or None for never
+        """
+        if self.session_duration <= 0:
+            return None
+        return session.created_at + timedelta(seconds=self.session_duration)
+
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
         Fetch user id of specified session
@@ -44,18 +69,23 @@ class SessionDBAuth(SessionExpAuth):
         Returns:
             user_id: str
         """
+        entry = self.user_id_by_session_id.get(session_id)
+        if entry is not None:
+            if UserSession.get(entry[1]) is not None:
+                return entry[0]
+            self.user_id_by_session_id.pop(session_id)
         try:
-            sessions = UserSession.search({'session_id': session_id})
+            session = UserSession.query(session_id=session_id).first()
         except Exception:
             return None
-        if sessions is None or sessions == []:
+        if session is None:
             return None
-        time_now = datetime.now()
-        time_diff = timedelta(seconds=self.session_duration)
-        exp_time = sessions[0].created_at + time_diff
-        if exp_time < time_now:
+        exp_time = self.expires_at(session)
+        if exp_time is not None and exp_time < datetime.now():
             return None
-        return sessions[0].user_id
+        self.user_id_by_session_id.set(
+            session_id, (session.user_id, session.id), exp_time)
+        return session.user_id
 
     def destroy_session(self, request=None):
         """
@@ -67,10 +97,11 @@ class SessionDBAuth(SessionExpAuth):
         """
         session_id = self.session_cookie(request)
         try:
-            sessions = UserSession.search({'session_id': session_id})
+            session = UserSession.query(session_id=session_id).first()
         except Exception:
             return False
-        if len(sessions) <= 0:
+        if session is None:
             return False
-        sessions[0].remove()
+        session.remove()
+        self.user_id_by_session_id.pop(session_id)
         return True
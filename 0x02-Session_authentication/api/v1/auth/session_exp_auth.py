@@ -7,6 +7,7 @@ That manages time based sessions.
 
 from os import getenv
 from datetime import datetime, timedelta
+from typing import Optional, Tuple
 from .session_auth import SessionAuth
 
 
@@ -14,6 +15,10 @@ class SessionExpAuth(SessionAuth):
     """
     SessionAuth class to manage a session
     With expiry time
+
+    Sessions are stored with their expiry time, the store drops
+    expired ones as it goes & every SESSION_SWEEP_INTERVAL seconds
+    when set.
     """
 
     def __init__(self) -> None:
@@ -22,24 +27,29 @@ class SessionExpAuth(SessionAuth):
             self.session_duration = int(getenv('SESSION_DURATION', '0'))
         except Exception:
             self.session_duration = 0
-    user_id_by_session_id = {}
+        try:
+            interval = float(getenv('SESSION_SWEEP_INTERVAL', '0'))
+        except Exception:
+            interval = 0
+        if interval > 0 and self.session_duration > 0:
+            self.user_id_by_session_id.start_sweeper(interval)
 
-    def create_session(self, user_id: str = None) -> str:
+    def session_entry(
+        self, user_id: str
+    ) -> Tuple[object, Optional[datetime]]:
         """
-        Create a session for the user
+        Data stored for a new session
         Args:
             user_id: str
         Returns:
-            user_id: str
+            Tuple: session data, expiry time or None for never
         """
-        session_id = super().create_session(user_id)
-        if session_id and isinstance(session_id, str):
-            self.user_id_by_session_id[session_id] = {
-                'user_id': user_id,
-                'created_at': datetime.now()
-            }
-            return session_id
-        return None
+        created_at = datetime.now()
+        expires_at = None
+        if self.session_duration > 0:
+            expires_at = created_at + timedelta(
+                seconds=self.session_duration)
+        return {'user_id': user_id, 'created_at': created_at}, expires_at
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
         """
@@ -49,17 +59,16 @@ class SessionExpAuth(SessionAuth):
         Returns:
             user_id: str
         """
-        sess_id = self.user_id_by_session_id
-        if session_id in sess_id:
-            session = sess_id[session_id]
-            if self.session_duration <= 0:
-                return session['user_id']
-            if 'created_at' not in session:
-                return None
-            now_time = datetime.now()
-            time_diff = timedelta(seconds=self.session_duration)
-            exp_time = session['created_at'] + time_diff
-            if exp_time < now_time:
-                return None
+        session = self.user_id_by_session_id.get(session_id)
+        if session is None:
+            return None
+        if self.session_duration <= 0:
             return session['user_id']
-        return None
+        if 'created_at' not in session:
+            return None
+        now_time = datetime.now()
+        time_diff = timedelta(seconds=self.session_duration)
+        exp_time = session['created_at'] + time_diff
+        if exp_time < now_time:
+            return None
+        return session['user_id']
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+"""
+Session Store Module
+Thread safe sessions split across independently locked stripes.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+from typing import Optional
+import threading
+import time
+
+SWEEP_BATCH = 16
+
+
+class Stripe:
+    """
+    Sessions whose id hashes to one stripe, under one lock
+
+    Sessions are kept in least recently used order next to a heap
+    of their expiry times.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.expiry = []
+
+    def sweep(self, now: datetime, limit: int = None) -> int:
+        """
+        Drop expired sessions from the head of the heap, lock held
+        Args:
+            now: datetime
+            limit: int, most heap entries looked at, None for all
+        Returns:
+            int: number of sessions dropped
+        """
+        dropped = 0
+        expiry = self.expiry
+        while expiry and expiry[0][0] < now and limit != 0:
+            expires_at, session_id = heappop(expiry)
+            entry = self.sessions.get(session_id)
+            # a session set again since has a later heap entry
+            if entry is not None and entry[1] == expires_at:
+                del self.sessions[session_id]
+                dropped += 1
+            if limit is not None:
+                limit -= 1
+        return dropped
+
+    def evict(self, count: int, keep: int = 0) -> int:
+        """
+        Drop up to count least recently used sessions, leaving at
+        least keep, then rebuild the heap once most of it is stale,
+        lock held
+        Args:
+            count: int, sessions to drop
+            keep: int, most recently used sessions to leave
+        Returns:
+            int: number of sessions dropped
+        """
+        sessions = self.sessions
+        dropped = 0
+        while dropped < count and len(sessions) > keep:
+            sessions.popitem(last=False)
+            dropped += 1
+        if len(self.expiry) > 2 * len(sessions) + SWEEP_BATCH:
+            self.expiry = [entry for entry in self.expiry
+                           if entry[1] in sessions and
+                           sessions[entry[1]][1] == entry[0]]
+            heapify(self.expiry)
+        return dropped
+
+
+class SessionStore:
+    """
+    Sessions spread over stripes by the hash of their id, each with
+    its own lock, so threads working on different sessions rarely
+    wait on each other. set, get & pop are atomic.
+
+    max_sessions caps the whole store: the size is counted under a
+    small lock taken after a stripe's, and a set that takes it over the
+    cap evicts the least recently used sessions of its own stripe, then
+    of the others one at a time. Every set & get drops up to
+    SWEEP_BATCH expired sessions of its stripe.
+    """
+
+    def __init__(self, stripes: int = 16, max_sessions: int = 0) -> None:
+        self.stripes = [Stripe() for _ in range(max(1, stripes))]
+        self.max_sessions = max(0, max_sessions)
+        self.size = 0
+        self.size_lock = threading.Lock()
+
+    def resize(self, delta: int) -> int:
+        """
+        Count sessions added or dropped
+        Args:
+            delta: int
+        Returns:
+            int: sessions over max_sessions, 0 without a cap
+        """
+        with self.size_lock:
+            self.size += delta
+            if self.max_sessions <= 0:
+                return 0
+            return max(0, self.size - self.max_sessions)
+
+    def stripe(self, session_id: str) -> Stripe:
+        """
+        Stripe holding a session id
+        Args:
+            session_id: str
+        Returns:
+            Stripe: stripe
+        """
+        return self.stripes[hash(session_id) % len(self.stripes)]
+
+    def set(
+        self, session_id: str, value, expires_at: datetime = None
+    ) -> None:
+        """
+        Store a session
+        Args:
+            session_id: str
+            value: session data
+            expires_at: datetime, None for never
+        """
+        stripe = self.stripe(session_id)
+        with stripe.lock:
+            added = session_id not in stripe.sessions
+            stripe.sessions[session_id] = (value, expires_at)
+            stripe.sessions.move_to_end(session_id)
+            if expires_at is not None:
+                heappush(stripe.expiry, (expires_at, session_id))
+            dropped = stripe.sweep(datetime.now(), SWEEP_BATCH)
+            over = self.resize(added - dropped)
+            # never the session just set
+            over = self.resize(-stripe.evict(over, 1))
+        for other in self.stripes:
+            if over <= 0:
+                break
+            if other is stripe:
+                continue
+            # one lock at a time, stripes never wait on each other
+            with other.lock:
+                over = self.resize(-other.evict(self.resize(0)))
+
+    def get(self, session_id: str) -> Optional[object]:
+        """
+        Fetch a session, marking it as recently used
+        Args:
+            session_id: str
+        Returns:
+            session data or None if missing or expired
+        """
+        stripe = self.stripe(session_id)
+        now = datetime.now()
+        with stripe.lock:
+            dropped = stripe.sweep(now, SWEEP_BATCH)
+            entry = stripe.sessions.get(session_id)
+            if entry is not None and entry[1] is not None \
+                    and entry[1] < now:
+                del stripe.sessions[session_id]
+                dropped += 1
+                entry = None
+            if dropped:
+                self.resize(-dropped)
+            if entry is None:
+                return None
+            stripe.sessions.move_to_end(session_id)
+            return entry[0]
+
+    def pop(self, session_id: str) -> Optional[object]:
+        """
+        Remove a session
+        Args:
+            session_id: str
+        Returns:
+            session data or None if missing
+        """
+        stripe = self.stripe(session_id)
+        with stripe.lock:
+            entry = stripe.sessions.pop(session_id, None)
+            if entry is not None:
+                self.resize(-1)
+        return None if entry is None else entry[0]
+
+    def sweep(self) -> int:
+        """
+        Drop every expired session, one stripe at a time
+        Returns:
+            int: number of sessions dropped
+        """
+        dropped = 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                count = stripe.sweep(datetime.now())
+                self.resize(-count)
+            dropped += count
+        return dropped
+
+    def start_sweeper(self, interval: float) -> threading.Thread:
+        """
+        Sweep in a background thread
+        Args:
+            interval: float, seconds between sweeps
+        Returns:
+            threading.Thread: the sweeper
+        """
+        def run():
+            while True:
+                time.sleep(interval)
+                self.sweep()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def __len__(self) -> int:
+        with self.size_lock:
+            return self.size
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
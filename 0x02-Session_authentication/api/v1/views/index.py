@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 """ Module of Index views
 """
+from datetime import datetime, timedelta
+from os import getenv
 from flask import jsonify, abort
 from api.v1.views import app_views
+from models.user import User
+from models.user_session import UserSession
 
 
 @app_views.route('/status', methods=['GET'], strict_slashes=False)
@@ -18,11 +22,23 @@ def status() -> str:
 def stats() -> str:
     """ GET /api/v1/stats
     Return:
-      - the number of each objects
+      - the number of each objects, the objects created & removed
+        by this worker since start, active & expired sessions
     """
-    from models.user import User
     stats = {}
     stats['users'] = User.count()
+    stats['models'] = {cls.__name__: cls.stats()
+                       for cls in (User, UserSession)}
+    try:
+        duration = int(getenv('SESSION_DURATION', '0'))
+    except ValueError:
+        duration = 0
+    total = stats['models']['UserSession']['count']
+    expired = 0
+    if duration > 0:
+        expired = UserSession.count_created_before(
+            datetime.utcnow() - timedelta(seconds=duration))
+    stats['sessions'] = {'active': total - expired, 'expired': expired}
     return jsonify(stats)
 
 
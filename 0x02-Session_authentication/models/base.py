@@ -1,20 +1,83 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from bisect import bisect_left, bisect_right, insort
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import TypeVar, List, Iterable, Optional, Tuple
 import json
+import threading
+import time
 import uuid
 
+from models.engine import get_storage
+
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
 DATA = {}
+STORAGE = get_storage()
+INDEXES = {}
+INDEX_KEYS = {}
+BULK = threading.local()
+BULKS = set()
+LOCK = threading.RLock()
+LOAD_STATS = {}
+FIELDS = {}
+UNINDEXED = object()
+ORDERED = {}
+COUNTERS = {}
+
+
+class LazyTimestamp():
+    """ Timestamp stored as integer UTC seconds in a slot,
+    or as its TIMESTAMP_FORMAT string until first read
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        """ Store the value in the matching underscore slot
+        """
+        self.slot = owner.__dict__['_' + name]
+
+    def __get__(self, obj: object, objtype: type = None) -> datetime:
+        """ Parse the stored string on first access
+        """
+        if obj is None:
+            return self
+        value = self.slot.__get__(obj)
+        if type(value) is str:
+            parsed = datetime.strptime(value, TIMESTAMP_FORMAT)
+            self.__set__(obj, parsed)
+            return parsed
+        return EPOCH + timedelta(seconds=value)
+
+    def __set__(self, obj: object, value):
+        """ Store a datetime as integer seconds, or a raw string
+        """
+        if type(value) is datetime:
+            value = (value - EPOCH) // timedelta(seconds=1)
+        self.slot.__set__(obj, value)
+
+    def dump(self, obj: object) -> str:
+        """ TIMESTAMP_FORMAT string without building a datetime
+        """
+        value = self.slot.__get__(obj)
+        if type(value) is str:
+            return value
+        return time.strftime(TIMESTAMP_FORMAT, time.gmtime(value))
 
 
 class Base():
     """ Base class
+    Attributes live in __slots__, subclasses declare their own;
+    those of subclasses without __slots__ live in __dict__.
     """
+    __slots__ = ('id', '_created_at', '_updated_at', '_json')
+    indexed_attributes = ()
+    journaled = False
+    created_at = LazyTimestamp()
+    updated_at = LazyTimestamp()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -23,15 +86,15 @@ class Base():
         if DATA.get(s_class) is None:
             DATA[s_class] = {}
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.id = kwargs.get('id')
+        if self.id is None:
+            self.id = str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,62 +107,429 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def fields(cls) -> List[tuple]:
+        """ (name, LazyTimestamp or None) of every serialized attribute
+        """
+        fields = FIELDS.get(cls)
+        if fields is None:
+            fields = [('id', None), ('created_at', Base.created_at),
+                      ('updated_at', Base.updated_at)]
+            for klass in reversed(cls.__mro__[:cls.__mro__.index(Base)]):
+                for name in klass.__dict__.get('__slots__', ()):
+                    fields.append((name, None))
+            FIELDS[cls] = fields
+        return fields
+
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, dropping the cached serialized forms
+        & remembering the stored state first inside bulk()
+        """
+        if getattr(BULK, 'states', None) is not None:
+            self.remember()
+        object.__setattr__(self, name, value)
+        object.__setattr__(self, '_json', None)
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
+        return dict(self.serialized(for_serialization))
+
+    def serialized(self, for_serialization: bool = False) -> dict:
+        """ Cached JSON dictionary, rebuilt after an attribute changes
+        The returned dict is shared, callers must not mutate it.
+        """
+        cache = self._json
+        if cache is None:
+            cache = [None, None, None]
+            object.__setattr__(self, '_json', cache)
+        result = cache[for_serialization]
+        if result is None:
+            result = {}
+            for key, timestamp in self.__class__.fields():
+                if not for_serialization and key[0] == '_':
+                    continue
+                if timestamp is not None:
+                    result[key] = timestamp.dump(self)
+                else:
+                    result[key] = getattr(self, key)
+            for key, value in getattr(self, '__dict__', {}).items():
+                if not for_serialization and key[0] == '_':
+                    continue
+                if type(value) is datetime:
+                    result[key] = value.strftime(TIMESTAMP_FORMAT)
+                else:
+                    result[key] = value
+            cache[for_serialization] = result
         return result
 
+    def remember(self):
+        """ Keep the serialized state of a stored object for
+        rollback on first change in bulk()
+        """
+        cls = self.__class__
+        obj_id = getattr(self, 'id', None)
+        key = (cls.__name__, obj_id)
+        if key not in BULK.states and \
+                DATA.get(cls.__name__, {}).get(obj_id) is self:
+            cls.backup(obj_id)
+            BULK.states[key] = dict(self.serialized(True))
+
+    def restore(self, state: dict):
+        """ Set the attributes of a serialized state back in place,
+        so references to the object stay valid
+        """
+        fresh = self.__class__(**state)
+        for klass in self.__class__.__mro__:
+            for name in klass.__dict__.get('__slots__', ()):
+                if name == '_json' or name.startswith('__'):
+                    continue
+                try:
+                    object.__setattr__(self, name, getattr(fresh, name))
+                except AttributeError:
+                    # unset in the state, unset it here too
+                    if hasattr(self, name):
+                        object.__delattr__(self, name)
+        if hasattr(self, '__dict__'):
+            self.__dict__.clear()
+            self.__dict__.update(fresh.__dict__)
+        object.__setattr__(self, '_json', None)
+
+    def dumps(self) -> str:
+        """ Cached JSON text of the serialized object
+        """
+        self.serialized(True)
+        cache = self._json
+        if cache[2] is None:
+            cache[2] = json.dumps(cache[1])
+        return cache[2]
+
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from the storage engine
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
+        start = time.perf_counter()
         DATA[s_class] = {}
-        if not path.exists(file_path):
+        INDEXES[s_class] = {}
+        INDEX_KEYS[s_class] = {}
+        ORDERED[s_class] = None
+        for op, value in STORAGE.load(cls):
+            if op == 'save':
+                cls.put(cls(**value))
+            else:
+                cls.drop(value)
+        LOAD_STATS[s_class] = {'count': len(DATA[s_class]),
+                               'seconds': time.perf_counter() - start}
+
+    @classmethod
+    def save_to_file(cls):
+        """ Save all objects to the storage engine
+        """
+        STORAGE.flush(cls, DATA[cls.__name__])
+
+    @staticmethod
+    def flush():
+        """ Wait until every save & remove so far is written
+        """
+        STORAGE.sync()
+
+    @classmethod
+    def refresh(cls) -> int:
+        """ Apply what other processes stored since load or the last
+        refresh, only rebuilding objects whose attributes differ
+        Skipped while a bulk() block is open in any thread.
+        Returns the number of objects changed.
+        """
+        s_class = cls.__name__
+        if s_class not in DATA:
+            return 0
+        with LOCK:
+            if BULKS:
+                # retried on the next refresh once the blocks end
+                return 0
+            entries = STORAGE.changes(cls)
+            if entries is None:
+                return 0
+            objs = DATA[s_class]
+            changed = 0
+            for op, value in entries:
+                if op == 'save':
+                    old = objs.get(value['id'])
+                    if old is not None and old.serialized(True) == value:
+                        continue
+                    cls.put(cls(**value))
+                    changed += 1
+                elif op == 'remove':
+                    if value in objs:
+                        cls.drop(value)
+                        changed += 1
+                else:
+                    for obj_id in [i for i in objs if i not in value]:
+                        cls.drop(obj_id)
+                        changed += 1
+            return changed
+
+    @classmethod
+    def put(cls, obj: TypeVar('Base')):
+        """ Store an object in DATA & its secondary indexes
+        """
+        s_class = cls.__name__
+        old = DATA[s_class].get(obj.id)
+        DATA[s_class][obj.id] = obj
+        cls.reorder(old, obj)
+        indexes = INDEXES.setdefault(s_class, {})
+        keys = INDEX_KEYS.setdefault(s_class, {})
+        cls.unindex(obj.id)
+        if not cls.indexed_attributes:
             return
+        values = []
+        for attr in cls.indexed_attributes:
+            value = getattr(obj, attr, None)
+            index = indexes.setdefault(attr, {})
+            try:
+                bucket = index.get(value)
+            except TypeError:
+                # unhashable values are only found by scanning
+                values.append(UNINDEXED)
+                continue
+            # a lone object is stored as is, saving a dict per value
+            if bucket is None or bucket is obj:
+                index[value] = obj
+            elif type(bucket) is dict:
+                bucket[obj.id] = obj
+            else:
+                index[value] = {bucket.id: bucket, obj.id: obj}
+            values.append(value)
+        keys[obj.id] = tuple(values)
+
+    @classmethod
+    def drop(cls, obj_id: str):
+        """ Remove an object from DATA & its secondary indexes
+        """
+        old = DATA[cls.__name__].pop(obj_id, None)
+        cls.reorder(old, None)
+        cls.unindex(obj_id)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @staticmethod
+    def order_key(obj: TypeVar('Base')) -> Tuple[str, str]:
+        """ Keyset sort key, TIMESTAMP_FORMAT strings sort by time
+        """
+        return (Base.created_at.dump(obj), obj.id)
 
     @classmethod
-    def save_to_file(cls):
-        """ Save all objects to file
+    def reorder(cls, old: TypeVar('Base'), new: TypeVar('Base')):
+        """ Move an object within the sorted index, once it is built
+        """
+        ordered = ORDERED.get(cls.__name__)
+        if ordered is None:
+            return
+        old_key = cls.order_key(old) if old is not None else None
+        new_key = cls.order_key(new) if new is not None else None
+        if old_key == new_key:
+            return
+        if old_key is not None:
+            i = bisect_left(ordered, old_key)
+            if i < len(ordered) and ordered[i] == old_key:
+                del ordered[i]
+        if new_key is not None:
+            insort(ordered, new_key)
+
+    @classmethod
+    def ordered(cls) -> List[Tuple[str, str]]:
+        """ Sorted (created_at, id) index, built on first use
+        then kept up to date
+        """
+        s_class = cls.__name__
+        ordered = ORDERED.get(s_class)
+        if ordered is None:
+            # saves keep it up to date under LOCK once it is set
+            with LOCK:
+                ordered = ORDERED.get(s_class)
+                if ordered is None:
+                    ordered = sorted(map(cls.order_key,
+                                         DATA[s_class].values()))
+                    ORDERED[s_class] = ordered
+        return ordered
+
+    @classmethod
+    def page(
+        cls, limit: int, cursor: str = None
+    ) -> Tuple[List[TypeVar('Base')], Optional[str]]:
+        """ Objects ordered by (created_at, id) after cursor
+        Returns the page and the cursor of the next one, if any.
+        Raises ValueError on a malformed cursor.
+        """
+        s_class = cls.__name__
+        ordered = cls.ordered()
+        start = 0
+        if cursor:
+            try:
+                decoded = urlsafe_b64decode(cursor.encode()).decode()
+            except Exception:
+                decoded = ''
+            if ' ' not in decoded:
+                raise ValueError('Invalid cursor')
+            start = bisect_right(ordered, tuple(decoded.split(' ', 1)))
+        keys = ordered[start:start + limit]
+        # objects removed by another thread meanwhile are skipped
+        found = map(DATA[s_class].get, (obj_id for _, obj_id in keys))
+        objs = [obj for obj in found if obj is not None]
+        next_cursor = None
+        if keys and start + limit < len(ordered):
+            next_cursor = urlsafe_b64encode(
+                ' '.join(keys[-1]).encode()).decode()
+        return objs, next_cursor
+
+    @classmethod
+    def unindex(cls, obj_id: str):
+        """ Remove an object from the secondary indexes
+        """
+        s_class = cls.__name__
+        values = INDEX_KEYS.get(s_class, {}).pop(obj_id, None)
+        if values is None:
+            return
+        for attr, value in zip(cls.indexed_attributes, values):
+            if value is UNINDEXED:
+                continue
+            index = INDEXES[s_class][attr]
+            bucket = index[value]
+            if type(bucket) is not dict:
+                del index[value]
+                continue
+            bucket.pop(obj_id, None)
+            if len(bucket) == 1:
+                index[value] = next(iter(bucket.values()))
+
+    @classmethod
+    def lookup(cls, attr: str, value) -> List[TypeVar('Base')]:
+        """ Objects whose indexed attribute had value when saved
+        """
+        bucket = INDEXES.get(cls.__name__, {}).get(attr, {}).get(value)
+        if bucket is None:
+            return []
+        if type(bucket) is dict:
+            return list(bucket.values())
+        return [bucket]
+
+    @staticmethod
+    @contextmanager
+    def bulk():
+        """ Buffer saves & removes of every class in the block,
+        committing each touched class once at exit or restoring
+        the objects it touched as stored if the block raises.
+        LOCK is only held to commit or roll back, other threads
+        go on meanwhile & refresh() waits for every block to end.
+        """
+        if getattr(BULK, 'classes', None) is not None:
+            # nested block, the outermost one commits
+            yield
+            return
+        ident = threading.get_ident()
+        with LOCK:
+            BULKS.add(ident)
+        BULK.classes, BULK.backup, BULK.changes = {}, {}, {}
+        BULK.states = {}
+        try:
+            yield
+        except BaseException:
+            states, BULK.states = BULK.states, None
+            with LOCK:
+                for s_class, (objs, tallies) in BULK.backup.items():
+                    cls = BULK.classes[s_class]
+                    counters = COUNTERS.get(s_class, {})
+                    for counter, count in tallies.items():
+                        counters[counter] -= count
+                    changes = {}
+                    for obj_id, obj in objs.items():
+                        state = states.get((s_class, obj_id))
+                        changes[obj_id] = None
+                        if obj is None:
+                            cls.drop(obj_id)
+                            continue
+                        if state is not None:
+                            # attributes changed in the block
+                            obj.restore(state)
+                        changes[obj_id] = obj
+                        cls.put(obj)
+                    # keys of objects changed in place, rebuilt on use
+                    ORDERED[s_class] = None
+                    # saves of other threads may have written the block
+                    STORAGE.commit(cls, changes, DATA[s_class])
+            raise
+        else:
+            with LOCK:
+                for s_class, changes in BULK.changes.items():
+                    cls = BULK.classes[s_class]
+                    STORAGE.commit(cls, changes, DATA[s_class])
+        finally:
+            BULK.classes = BULK.backup = BULK.changes = None
+            BULK.states = None
+            with LOCK:
+                BULKS.discard(ident)
+
+    @classmethod
+    def persist(cls, op: str, obj: TypeVar('Base')):
+        """ Commit a save/remove to storage, or defer it inside bulk()
+        """
+        s_class = cls.__name__
+        changes = {obj.id: obj if op == 'save' else None}
+        if getattr(BULK, 'classes', None) is not None:
+            BULK.classes[s_class] = cls
+            BULK.changes.setdefault(s_class, {}).update(changes)
+        else:
+            STORAGE.commit(cls, changes, DATA[s_class])
+
+    @classmethod
+    def backup(cls, obj_id: str):
+        """ Keep the stored object of an id for rollback
+        on its first change in bulk()
         """
         s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        if getattr(BULK, 'backup', None) is None:
+            return
+        if s_class not in BULK.backup:
+            BULK.backup[s_class] = ({}, {})
+            BULK.classes[s_class] = cls
+        objs = BULK.backup[s_class][0]
+        if obj_id not in objs:
+            objs[obj_id] = DATA[s_class].get(obj_id)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def tally(cls, counter: str):
+        """ Count a save or removal made by this process
+        """
+        s_class = cls.__name__
+        counters = COUNTERS.setdefault(
+            s_class, {'created': 0, 'removed': 0})
+        counters[counter] += 1
+        if getattr(BULK, 'backup', None) is not None:
+            # undone if the block rolls back
+            tallies = BULK.backup[s_class][1]
+            tallies[counter] = tallies.get(counter, 0) + 1
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with LOCK:
+            self.__class__.backup(self.id)
+            self.updated_at = datetime.utcnow()
+            if DATA[s_class].get(self.id) is None:
+                self.__class__.tally('created')
+            self.__class__.put(self)
+            self.__class__.persist('save', self)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        with LOCK:
+            if DATA[s_class].get(self.id) is not None:
+                self.__class__.backup(self.id)
+                self.__class__.tally('removed')
+                self.__class__.drop(self.id)
+                self.__class__.persist('remove', self)
 
     @classmethod
     def count(cls) -> int:
@@ -108,6 +538,26 @@ class Base():
         s_class = cls.__name__
         return len(DATA[s_class].keys())
 
+    @classmethod
+    def count_created_before(cls, moment: datetime) -> int:
+        """ Count objects created before moment (UTC)
+        by bisecting the sorted created_at index
+        """
+        if cls.__name__ not in DATA:
+            return 0
+        key = (moment.strftime(TIMESTAMP_FORMAT),)
+        return bisect_left(cls.ordered(), key)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """ Objects held, created & removed by this process since start
+        """
+        s_class = cls.__name__
+        counters = COUNTERS.get(s_class, {})
+        return {'count': len(DATA.get(s_class, {})),
+                'created': counters.get('created', 0),
+                'removed': counters.get('removed', 0)}
+
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
         """ Return all objects
@@ -121,17 +571,20 @@ class Base():
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
+    @classmethod
+    def query(cls, **conditions: dict) -> 'Query':
+        """ Query on the objects of the class, see models.query.Query
+        Conditions are attr=value or attr__op=value.
+        """
+        from models.query import Query
+        return Query(cls).filter(**conditions)
+
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        from models.query import Query
+        query = Query(cls)
+        for k, v in attributes.items():
+            query.where(k, 'eq', v)
+        return query.all()
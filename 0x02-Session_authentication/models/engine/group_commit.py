@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" Background group-commit writer
+"""
+from typing import Dict, Iterator, List, Optional, Tuple, TypeVar
+import atexit
+import threading
+import time
+
+from models.engine.storage import Storage
+
+RETRY_DELAY = 1.0
+
+
+class GroupCommitStorage(Storage):
+    """ Queues commits for a background thread that coalesces them
+    per class & writes each class once per group window
+
+    A class whose write fails goes back to the queue with every class
+    not written yet, merged with what was queued since, & is retried
+    every RETRY_DELAY seconds. The writer stays failed, sync() raising
+    its error, until a whole batch is written.
+    """
+
+    def __init__(self, storage: Storage, delay: float = 0.05):
+        """ Initialize the writer around another engine
+        """
+        self.storage = storage
+        self.delay = delay
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.busy = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        atexit.register(self.sync)
+
+    def load(self, cls: type) -> Iterator[Tuple[str, object]]:
+        """ Stored state of a class, once queued writes are done
+        """
+        self.sync()
+        return self.storage.load(cls)
+
+    def changes(self, cls: type) -> Optional[List[Tuple[str, object]]]:
+        """ Changes of other processes, once our own are written
+        so they cannot be mistaken for removals, none while the
+        writer is failing
+        """
+        if not self.wait():
+            return None
+        return self.storage.changes(cls)
+
+    def commit(
+        self, cls: type, changes: Dict[str, Optional[TypeVar('Base')]],
+        objs: Dict[str, TypeVar('Base')]
+    ):
+        """ Queue changes, merged with those not yet written
+        """
+        self.queue(cls, dict(changes), objs)
+
+    def flush(self, cls: type, objs: Dict[str, TypeVar('Base')]):
+        """ Queue a full rewrite of a class
+        """
+        self.queue(cls, None, objs)
+
+    def queue(self, cls: type, changes: Optional[dict], objs: dict):
+        """ Merge into the pending entry of a class, None means rewrite
+        """
+        with self.cond:
+            entry = self.pending.get(cls.__name__)
+            if entry is not None and entry[1] is not None \
+                    and changes is not None:
+                entry[1].update(changes)
+                changes = entry[1]
+            elif entry is not None:
+                changes = None
+            self.pending[cls.__name__] = (cls, changes, objs)
+            self.cond.notify_all()
+
+    def requeue(self, cls: type, changes: Optional[dict], objs: dict):
+        """ Put back a failed write, under what was queued since
+        """
+        entry = self.pending.get(cls.__name__)
+        if entry is not None:
+            if changes is not None and entry[1] is not None:
+                changes = dict(changes)
+                changes.update(entry[1])
+            else:
+                changes = None
+            objs = entry[2]
+        self.pending[cls.__name__] = (cls, changes, objs)
+
+    def wait(self) -> bool:
+        """ Wait until every queued write is on disk or the writer
+        fails, returns whether it did not fail
+        """
+        with self.cond:
+            while (self.pending or self.busy) and self.error is None:
+                self.cond.wait()
+            return self.error is None
+
+    def sync(self):
+        """ Wait until every queued write is on disk,
+        raising the error of the writer while it is failing
+        """
+        if not self.wait():
+            raise self.error
+
+    def run(self):
+        """ Writer loop: wait for work, let a group gather, write it
+        """
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+            time.sleep(self.delay if self.error is None else RETRY_DELAY)
+            with self.cond:
+                batch, self.pending = self.pending, {}
+                self.busy = True
+            entries = list(batch.values())
+            error, done = None, 0
+            for cls, changes, objs in entries:
+                try:
+                    # dict copy holds the GIL, so this is a consistent
+                    # snapshot even while request threads keep saving
+                    snapshot = dict(objs)
+                    if changes is None:
+                        self.storage.flush(cls, snapshot)
+                    else:
+                        self.storage.commit(cls, changes, snapshot)
+                except Exception as e:
+                    error = e
+                    break
+                done += 1
+            with self.cond:
+                for entry in entries[done:]:
+                    self.requeue(*entry)
+                self.error = error
+                self.busy = False
+                self.cond.notify_all()
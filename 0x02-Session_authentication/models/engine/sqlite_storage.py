@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+""" SQLite storage engine
+"""
+from typing import Dict, Iterator, List, Optional, Tuple, TypeVar
+import json
+import sqlite3
+import threading
+
+from models.engine.storage import Storage
+
+CHANGE_LOG_SIZE = 10000
+
+
+class SQLiteStorage(Storage):
+    """ One table per class in a WAL mode database,
+    with a column & an index per indexed attribute
+
+    Every transaction also logs the ids it wrote to _changes, which
+    other processes read from where they left off. A NULL id marks
+    a full rewrite, the log keeps the last CHANGE_LOG_SIZE entries.
+    """
+
+    def __init__(self, db_path: str):
+        """ Initialize the engine
+        """
+        self.db_path = db_path
+        self.local = threading.local()
+        self.tables = {}
+        self.seqs = {}
+        self.lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread
+        """
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS _changes (seq INTEGER '
+                'PRIMARY KEY AUTOINCREMENT, class TEXT NOT NULL, id TEXT)')
+            self.local.conn = conn
+            self.local.versions = {}
+        return conn
+
+    def statements(self, cls: type) -> Dict[str, str]:
+        """ SQL of a class, creating its table & indexes on first use
+        """
+        s_class = cls.__name__
+        sql = self.tables.get(s_class)
+        if sql is not None:
+            return sql
+        with self.lock:
+            conn = self.connection()
+            columns = ['id', 'created_at', 'updated_at']
+            columns += list(cls.indexed_attributes)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS "{}" (id TEXT PRIMARY KEY, '
+                'created_at TEXT, updated_at TEXT, data TEXT NOT NULL)'
+                .format(s_class))
+            existing = {row[1] for row in conn.execute(
+                'PRAGMA table_info("{}")'.format(s_class))}
+            for attr in cls.indexed_attributes:
+                if attr not in existing:
+                    conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'
+                                 .format(s_class, attr))
+                conn.execute(
+                    'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'
+                    .format(s_class, attr))
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS "{0}_created_at" '
+                'ON "{0}" (created_at, id)'.format(s_class))
+            names = ', '.join('"{}"'.format(c) for c in columns + ['data'])
+            marks = ', '.join('?' * (len(columns) + 1))
+            sql = {
+                'select': 'SELECT data FROM "{}"'.format(s_class),
+                'fetch': 'SELECT id, data FROM "{}" WHERE id IN ({{}})'
+                         .format(s_class),
+                'upsert': 'INSERT OR REPLACE INTO "{}" ({}) VALUES ({})'
+                          .format(s_class, names, marks),
+                'delete': 'DELETE FROM "{}" WHERE id = ?'.format(s_class),
+                'clear': 'DELETE FROM "{}"'.format(s_class),
+            }
+            self.tables[s_class] = sql
+        return sql
+
+    @staticmethod
+    def row(cls: type, obj: TypeVar('Base')) -> tuple:
+        """ Column values of an object
+        """
+        data = obj.serialized(True)
+        values = [obj.id, data['created_at'], data['updated_at']]
+        for attr in cls.indexed_attributes:
+            value = data.get(attr)
+            if not isinstance(value, (str, int, float, type(None))):
+                value = json.dumps(value)
+            values.append(value)
+        values.append(obj.dumps())
+        return tuple(values)
+
+    def load(self, cls: type) -> Iterator[Tuple[str, object]]:
+        """ Every stored object of a class
+        """
+        sql = self.statements(cls)
+        conn = self.connection()
+        # read first, a commit in between is only applied twice
+        self.seqs[cls.__name__] = self.last_seq(conn)
+        for (data,) in conn.execute(sql['select']):
+            yield 'save', json.loads(data)
+
+    @staticmethod
+    def last_seq(conn: sqlite3.Connection) -> int:
+        """ Newest entry of the change log
+        """
+        return conn.execute(
+            'SELECT COALESCE(MAX(seq), 0) FROM _changes').fetchone()[0]
+
+    def changes(self, cls: type) -> Optional[List[Tuple[str, object]]]:
+        """ Objects logged since load or the last call, or the whole
+        stored state after a rewrite or once the log moved past us
+        """
+        sql = self.statements(cls)
+        conn = self.connection()
+        s_class = cls.__name__
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if self.local.versions.get(s_class) == version:
+            return None
+        self.local.versions[s_class] = version
+        last = self.seqs.get(s_class, 0)
+        rows = conn.execute(
+            'SELECT seq, id FROM _changes WHERE seq > ? AND class = ? '
+            'ORDER BY seq', (last, s_class)).fetchall()
+        if not rows:
+            return None
+        oldest = conn.execute('SELECT MIN(seq) FROM _changes').fetchone()[0]
+        if oldest > last + 1 or any(obj_id is None for _, obj_id in rows):
+            entries = list(self.load(cls))
+            entries.append(('retain', {obj['id'] for _, obj in entries}))
+            return entries
+        self.seqs[s_class] = rows[-1][0]
+        ids = list(dict.fromkeys(obj_id for _, obj_id in rows))
+        found = {}
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            query = sql['fetch'].format(', '.join('?' * len(chunk)))
+            for obj_id, data in conn.execute(query, chunk):
+                found[obj_id] = json.loads(data)
+        return [('save', found[obj_id]) if obj_id in found
+                else ('remove', obj_id) for obj_id in ids]
+
+    def commit(
+        self, cls: type, changes: Dict[str, Optional[TypeVar('Base')]],
+        objs: Dict[str, TypeVar('Base')]
+    ):
+        """ Upsert & delete the changed rows in one transaction
+        """
+        sql = self.statements(cls)
+        saved = [self.row(cls, obj) for obj in changes.values()
+                 if obj is not None]
+        removed = [(obj_id,) for obj_id, obj in changes.items()
+                   if obj is None]
+        self.transaction(cls, sql, saved, removed)
+
+    def flush(self, cls: type, objs: Dict[str, TypeVar('Base')]):
+        """ Replace every row of a class
+        """
+        sql = self.statements(cls)
+        rows = [self.row(cls, obj) for obj in dict(objs).values()]
+        self.transaction(cls, sql, rows, None)
+
+    def transaction(
+        self, cls: type, sql: Dict[str, str], saved: list, removed: list
+    ):
+        """ Apply upserts & deletes atomically & log them,
+        clearing the table first when removed is None
+        """
+        conn = self.connection()
+        s_class = cls.__name__
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if removed is None:
+                conn.execute(sql['clear'])
+                logged = [(s_class, None)]
+            else:
+                conn.executemany(sql['delete'], removed)
+                logged = [(s_class, obj_id) for (obj_id,) in removed]
+            conn.executemany(sql['upsert'], saved)
+            if removed is not None:
+                logged += [(s_class, row[0]) for row in saved]
+            conn.executemany(
+                'INSERT INTO _changes (class, id) VALUES (?, ?)', logged)
+            seq = self.last_seq(conn)
+            conn.execute('DELETE FROM _changes WHERE seq <= ?',
+                         (seq - CHANGE_LOG_SIZE,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        with self.lock:
+            # caught up unless others logged since we last looked
+            if self.seqs.get(s_class, 0) == seq - len(logged):
+                self.seqs[s_class] = seq
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+""" Storage engine interface
+"""
+from typing import Dict, Iterator, List, Optional, Tuple, TypeVar
+
+
+class Storage():
+    """ Persists the objects of a model class
+    DATA stays the in-memory source for queries, an engine only
+    loads it at startup and records what changes.
+    """
+
+    def load(self, cls: type) -> Iterator[Tuple[str, object]]:
+        """ Stored state of a class, in apply order:
+        ('save', attributes) or ('remove', id)
+        """
+        raise NotImplementedError()
+
+    def commit(
+        self, cls: type, changes: Dict[str, Optional[TypeVar('Base')]],
+        objs: Dict[str, TypeVar('Base')]
+    ):
+        """ Persist saved objects, or removals mapped to None
+        objs holds every object of the class for engines
+        that rewrite everything.
+        """
+        raise NotImplementedError()
+
+    def flush(self, cls: type, objs: Dict[str, TypeVar('Base')]):
+        """ Replace the stored state of a class with objs
+        """
+        raise NotImplementedError()
+
+    def changes(self, cls: type) -> Optional[List[Tuple[str, object]]]:
+        """ What other processes stored since load or the last call,
+        None when nothing changed. Entries are those of load(),
+        a ('retain', ids) entry means every other object is gone.
+        """
+        return None
+
+    def sync(self):
+        """ Wait for writes still in flight, engines writing in the
+        caller's thread have none
+        """
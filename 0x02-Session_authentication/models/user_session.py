@@ -10,6 +10,9 @@ class UserSession(Base):
     """
     User session Class
     """
+    __slots__ = ('user_id', 'session_id')
+    indexed_attributes = ('session_id', 'user_id')
+    journaled = True
 
     def __init__(self, *args: list, **kwargs: dict):
         super().__init__(*args, **kwargs)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+"""
+Module to benchmark SessionStore under thread contention
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import List, Tuple
+from uuid import uuid4
+
+from api.v1.auth.session_store import SessionStore
+
+THREADS = (1, 4, 16)
+STRIPES = (1, 16)
+OPERATIONS = 20000
+READS = 8
+
+
+def worker(
+    store: SessionStore, operations: int, reads: int,
+    start: threading.Event, counts: List[int]
+) -> None:
+    """
+    Create, read & destroy sessions, keeping every other one
+    Args:
+        SessionStore: store
+        int: operations, sessions created
+        int: reads, lookups per session
+        threading.Event: start, released once every thread is ready
+        List[int]: counts, sessions this thread left in the store
+    """
+    session_ids = [str(uuid4()) for _ in range(operations)]
+    start.wait()
+    kept = 0
+    for i, session_id in enumerate(session_ids):
+        store.set(session_id, 'user')
+        for _ in range(reads):
+            store.get(session_id)
+        if i % 2:
+            store.pop(session_id)
+        else:
+            kept += 1
+    counts.append(kept)
+
+
+def run(
+    threads: int, stripes: int, operations: int, reads: int
+) -> Tuple[float, bool]:
+    """
+    Time one configuration
+    Args:
+        int: threads
+        int: stripes
+        int: operations, sessions created per thread
+        int: reads, lookups per session
+    Returns:
+        Tuple[float, bool]: operations per second & whether the
+        store holds exactly the sessions that were kept
+    """
+    store = SessionStore(stripes)
+    start = threading.Event()
+    counts = []
+    pool = [threading.Thread(target=worker,
+                             args=(store, operations, reads, start, counts))
+            for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    begin = time.perf_counter()
+    start.set()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - begin
+    total = threads * operations * (reads + 1.5)
+    return total / elapsed, len(store) == sum(counts)
+
+
+def main() -> None:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--threads', type=lambda s: tuple(
+        int(t) for t in s.split(',')), default=THREADS)
+    parser.add_argument('--stripes', type=lambda s: tuple(
+        int(t) for t in s.split(',')), default=STRIPES)
+    parser.add_argument('-n', '--operations', type=int, default=OPERATIONS)
+    parser.add_argument('-r', '--reads', type=int, default=READS)
+    args = parser.parse_args()
+    consistent = True
+    print('{:>8} {:>8} {:>14} {}'.format(
+        'threads', 'stripes', 'ops/s', 'consistent'))
+    for threads in args.threads:
+        for stripes in args.stripes:
+            rate, ok = run(threads, stripes, args.operations, args.reads)
+            consistent = consistent and ok
+            print('{:>8} {:>8} {:>14,.0f} {}'.format(threads, stripes,
+                                                     rate, ok))
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,13 +3,92 @@
 Module that handles authentication actions
 """
 
+import os
+import json
+import time
 import bcrypt
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from uuid import uuid4
-from typing import Union
+from typing import Callable, Iterable, Iterator, Tuple, Union
 from sqlalchemy.orm.exc import NoResultFound
 from db import DB
 from user import User
 
+WORKERS = os.cpu_count() or 1
+DEFAULT_COST = 12
+TARGET_MS = 250
+_cost = None
+
+
+def _get_cost() -> int:
+    """
+    Configured bcrypt work factor, from BCRYPT_ROUNDS
+    or the calibrated value stored in BCRYPT_CONFIG
+    Returns:
+        cost: int
+    """
+    global _cost
+    if _cost is None:
+        rounds = os.getenv('BCRYPT_ROUNDS')
+        if rounds is None:
+            config = os.getenv('BCRYPT_CONFIG', '.bcrypt.json')
+            try:
+                with open(config, 'r') as f:
+                    rounds = json.load(f)['rounds']
+            except (OSError, ValueError, KeyError):
+                rounds = DEFAULT_COST
+        _cost = int(rounds)
+    return _cost
+
+
+def _save_cost(cost: int) -> None:
+    """
+    Store a work factor in BCRYPT_CONFIG
+    Args:
+        cost: int
+    """
+    global _cost
+    config = os.getenv('BCRYPT_CONFIG', '.bcrypt.json')
+    with open(config, 'w') as f:
+        json.dump({'rounds': cost}, f)
+    _cost = cost
+
+
+def _calibrate_cost(
+    target_ms: float = TARGET_MS, min_cost: int = 4, max_cost: int = 16
+) -> int:
+    """
+    Highest work factor whose verify time stays under target_ms
+    Args:
+        target_ms: float
+        min_cost: int
+        max_cost: int
+    Returns:
+        cost: int
+    """
+    password = b'calibration password'
+    cost = min_cost
+    while cost < max_cost:
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(cost + 1))
+        start = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        cost += 1
+    return cost
+
+
+def _needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Check if a hash differs from the configured work factor
+    Args:
+        hashed_password: bytes
+    Returns:
+        bool: True if it should be rehashed
+    """
+    return int(hashed_password.split(b'$')[2]) != _get_cost()
+
 
 def _hash_password(password: str) -> bytes:
     """
@@ -19,7 +98,78 @@ def _hash_password(password: str) -> bytes:
     Returns:
         hashed_password: bytes
     """
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    salt = bcrypt.gensalt(_get_cost())
+    return bcrypt.hashpw(password.encode('utf-8'), salt)
+
+
+def _check_password(pair: Tuple[bytes, str]) -> bool:
+    """
+    Check a password against its hash
+    Args:
+        pair: (hashed_password, password)
+    Returns:
+        bool: True if it matches
+    """
+    hashed_password, password = pair
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def _ordered_map(
+    func: Callable, items: Iterable, workers: int, processes: bool
+) -> Iterator:
+    """
+    Map func over items on a pool, yielding results in input order
+    Args:
+        func: Callable
+        items: Iterable
+        workers: int
+        processes: bool, use processes instead of threads
+    Returns:
+        results: Iterator
+    """
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    pending = deque()
+    with executor(max_workers=workers) as pool:
+        for item in items:
+            pending.append(pool.submit(func, item))
+            # keep a bounded window in flight so large inputs stream
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _hash_passwords(
+    passwords: Iterable[str], workers: int = None, processes: bool = False
+) -> Iterator[bytes]:
+    """
+    Hash many passwords on a pool, bcrypt releases the GIL
+    Args:
+        passwords: Iterable[str]
+        workers: int, defaults to WORKERS
+        processes: bool
+    Returns:
+        hashed_passwords: Iterator[bytes] in input order
+    """
+    return _ordered_map(_hash_password, passwords, workers or WORKERS,
+                        processes)
+
+
+def _verify_many(
+    pairs: Iterable[Tuple[bytes, str]], workers: int = None,
+    processes: bool = False
+) -> Iterator[bool]:
+    """
+    Check many (hashed_password, password) pairs on a pool
+    Args:
+        pairs: Iterable[Tuple[bytes, str]]
+        workers: int, defaults to WORKERS
+        processes: bool
+    Returns:
+        results: Iterator[bool] in input order
+    """
+    return _ordered_map(_check_password, pairs, workers or WORKERS,
+                        processes)
 
 
 def _generate_uuid() -> str:
@@ -55,7 +205,8 @@ class Auth:
 
     def valid_login(self, email: str, password: str) -> bool:
         """
-        Check if given credentials are valid
+        Check if given credentials are valid,
+        rehashing the password if its work factor is outdated
         Args:
             email: str
             password: str
@@ -65,14 +216,17 @@ class Auth:
         user = None
         try:
             user = self._db.find_user_by(email=email)
-            if user is not None:
-                return bcrypt.checkpw(
-                    password.encode('utf-8'),
-                    user.hashed_password
-                )
         except NoResultFound:
             return False
-        return False
+        if user is None:
+            return False
+        if not bcrypt.checkpw(password.encode('utf-8'),
+                              user.hashed_password):
+            return False
+        if _needs_rehash(user.hashed_password):
+            self._db.update_user(user.id,
+                                 hashed_password=_hash_password(password))
+        return True
 
     def create_session(self, email: str) -> str:
         """
@@ -159,3 +313,8 @@ class Auth:
             hashed_password=new_password_hash,
             reset_token=None
         )
+
+
+if __name__ == '__main__':
+    _save_cost(_calibrate_cost())
+    print('bcrypt cost: {}'.format(_get_cost()))